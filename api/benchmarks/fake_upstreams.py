@@ -0,0 +1,213 @@
+"""
+Local stand-ins for Google Maps and Ollama, for load tests without quota or GPU.
+
+    cd api && python -m benchmarks.fake_upstreams --port 9100 \\
+        --latency-ms 80 --jitter-ms 20 --error-rate 0.01 \\
+        --route-points 2000 --places 20 --pages 3 \\
+        --ollama-latency-ms 300 --token-ms 15 --tokens 60
+
+Point the API at it with
+    GOOGLE_MAPS_BASE_URL=http://127.0.0.1:9100/maps/api
+    OLLAMA_BASE_URL=http://127.0.0.1:9100
+
+Serves Directions, Distance Matrix, Places Text Search, Place Details, Ollama /api/tags and
+/api/generate (blocking and NDJSON streaming), with the response fields the
+services read. Responses are built once per shape, so the fake itself stays
+cheap next to the API under test.
+"""
+import argparse
+import asyncio
+import json
+import random
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.polyline import synthetic_route
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    route_points: int = 500
+    places: int = 20
+    pages: int = 3
+    ollama_latency_ms: float = 200.0
+    token_ms: float = 10.0
+    tokens: int = 40
+    model: str = "llama3.2:3b"
+    seed: Optional[int] = None
+
+
+def _delay(rng: random.Random, mean_ms: float, jitter_ms: float) -> float:
+    return max(0.0, rng.gauss(mean_ms, jitter_ms)) / 1000
+
+
+@lru_cache(maxsize=32)
+def _polyline(points: int, legs: int) -> str:
+    return synthetic_route(points, max(1, legs))
+
+
+def _directions_body(cfg: FakeConfig, waypoints: str) -> dict:
+    legs = len([w for w in waypoints.split("|") if w]) + 1
+    return {
+        "status": "OK",
+        "routes": [{
+            "overview_polyline": {"points": _polyline(cfg.route_points, legs)},
+            "legs": [
+                {
+                    "distance": {"text": "52.3 km", "value": 52_300},
+                    "duration": {"text": "1 hour 5 mins", "value": 3_900},
+                    "start_address": f"Stop {i}, Indonesia",
+                    "end_address": f"Stop {i + 1}, Indonesia",
+                }
+                for i in range(legs)
+            ],
+        }],
+    }
+
+
+def _places_body(cfg: FakeConfig, query: str, page: int = 0) -> dict:
+    body = {
+        "status": "OK",
+        "results": [
+            {
+                "name": f"{query.title()} #{i + 1}",
+                "formatted_address": f"Jl. Benchmark No. {i + 1}, Jakarta",
+                "place_id": f"fake-{zlib.crc32(query.encode()) % 10_000}-{i}",
+                "geometry": {"location": {"lat": -6.2 + i * 0.001, "lng": 106.8 + i * 0.001}},
+                "rating": 4.0 + (i % 10) / 10,
+            }
+            for i in range(page * cfg.places, (page + 1) * cfg.places)
+        ],
+    }
+    if page + 1 < cfg.pages:
+        body["next_page_token"] = f"{page + 1}:{query}"
+    return body
+
+
+@lru_cache(maxsize=1)
+def _details_body() -> dict:
+    # Open 08:00-22:00 every day (local time, UTC+7)
+    periods = [{"open": {"day": d, "time": "0800"}, "close": {"day": d, "time": "2200"}} for d in range(7)]
+    days = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+    return {
+        "status": "OK",
+        "result": {
+            "rating": 4.5,
+            "user_ratings_total": 1200,
+            "utc_offset": 420,
+            "opening_hours": {"periods": periods, "weekday_text": [f"{d}: 8:00 AM – 10:00 PM" for d in days]},
+        },
+    }
+
+
+def _matrix_body(origins: List[str], destinations: List[str]) -> dict:
+    element = {
+        "status": "OK",
+        "distance": {"text": "12.0 km", "value": 12_000},
+        "duration": {"text": "25 mins", "value": 1_500},
+    }
+    return {
+        "status": "OK",
+        "origin_addresses": origins,
+        "destination_addresses": destinations,
+        "rows": [{"elements": [element] * len(destinations)} for _ in origins],
+    }
+
+
+def build_app(cfg: FakeConfig) -> FastAPI:
+    app = FastAPI(title="HeyPico fake upstreams")
+    rng = random.Random(cfg.seed)
+    words = ("Take", "the", "toll", "road", "for", "a", "faster", "trip", "and", "avoid", "rush", "hour.")
+
+    async def upstream_delay() -> Optional[JSONResponse]:
+        await asyncio.sleep(_delay(rng, cfg.latency_ms, cfg.jitter_ms))
+        if cfg.error_rate and rng.random() < cfg.error_rate:
+            return JSONResponse({"status": "UNKNOWN_ERROR"}, status_code=500)
+        return None
+
+    @app.get("/maps/api/directions/json")
+    async def directions(origin: str = "", destination: str = "", waypoints: str = ""):
+        return await upstream_delay() or _directions_body(cfg, waypoints)
+
+    @app.get("/maps/api/distancematrix/json")
+    async def distance_matrix(origins: str = "", destinations: str = ""):
+        return await upstream_delay() or _matrix_body(origins.split("|"), destinations.split("|"))
+
+    @app.get("/maps/api/place/textsearch/json")
+    async def text_search(query: str = "", pagetoken: str = ""):
+        if pagetoken:
+            page, _, query = pagetoken.partition(":")
+            return await upstream_delay() or _places_body(cfg, query, int(page))
+        return await upstream_delay() or _places_body(cfg, query)
+
+    @app.get("/maps/api/place/details/json")
+    async def place_details(place_id: str = ""):
+        return await upstream_delay() or {**_details_body(), "result": {**_details_body()["result"], "place_id": place_id}}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": cfg.model, "size": 2_019_393_189}]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(_delay(rng, cfg.ollama_latency_ms, cfg.ollama_latency_ms / 5))
+        if cfg.error_rate and rng.random() < cfg.error_rate:
+            return JSONResponse({"error": "fake failure"}, status_code=500)
+        if not payload.get("prompt"):
+            # Warm-up / keep-alive ping: load only
+            return {"model": payload.get("model"), "response": "", "done": True}
+        n = min(cfg.tokens, int(payload.get("options", {}).get("num_predict", cfg.tokens)))
+        tokens = [words[i % len(words)] + " " for i in range(n)]
+        prompt_tokens = len(payload["prompt"].split())
+        stats = {
+            # A sent `context` is already evaluated: only the new prompt counts
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": n,
+            "eval_duration": int(n * cfg.token_ms * 1e6),
+            "context": list(payload.get("context") or []) + list(range(prompt_tokens + n)),
+        }
+        if not payload.get("stream"):
+            await asyncio.sleep(n * cfg.token_ms / 1000)
+            return {"model": payload.get("model"), "response": "".join(tokens), "done": True, **stats}
+
+        async def ndjson():
+            for tok in tokens:
+                await asyncio.sleep(cfg.token_ms / 1000)
+                yield json.dumps({"response": tok, "done": False}) + "\n"
+            yield json.dumps({"response": "", "done": True, **stats}) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    defaults = FakeConfig()
+    for field in ("latency_ms", "jitter_ms", "error_rate", "ollama_latency_ms", "token_ms"):
+        parser.add_argument(f"--{field.replace('_', '-')}", type=float, default=getattr(defaults, field))
+    for field in ("route_points", "places", "pages", "tokens"):
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=getattr(defaults, field))
+    parser.add_argument("--model", default=defaults.model)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    cfg = FakeConfig(**{k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    uvicorn.run(build_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Closed-loop load generator for the HeyPico API.
+
+    cd api && python -m benchmarks.loadgen --local \\
+        --scenario maps-directions --scenario chat-directions-stream \\
+        --concurrency 32 --duration 20 --unique 0.2 --save baseline.json
+
+    # after a change, same flags:
+    cd api && python -m benchmarks.loadgen --local ... --compare baseline.json
+
+`--local` starts benchmarks.fake_upstreams and the API (uvicorn main:app) as
+subprocesses with the rate limiter off, so nothing leaves the machine;
+otherwise `--base-url` points at an API you started yourself. Each scenario
+runs on its own for the same duration with `--concurrency` workers, each
+sending its next request as soon as the previous one completes. `--unique`
+is the fraction of requests with a fresh cache key (0 = all cache hits after
+the first, 1 = all misses). Reports RPS, error count and p50/p95/p99/max
+latency, plus time to first byte for streamed scenarios.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+CITIES = ["Jakarta", "Bandung", "Bogor", "Depok", "Tangerang", "Bekasi", "BSD", "Cirebon", "Semarang", "Surabaya"]
+QUERIES = ["coffee", "nasi goreng", "sate", "bakso", "pharmacy", "gas station", "hotel", "bookstore"]
+
+# name -> (path, streamed?, body(rng, fresh_key or None))
+Scenario = Tuple[str, bool, Callable[[random.Random, Optional[str]], dict]]
+
+
+def _route(rng: random.Random, fresh: Optional[str]) -> dict:
+    origin, destination = rng.sample(CITIES, 2)
+    return {"origin": f"{origin} {fresh}" if fresh else origin, "destination": destination, "mode": "driving"}
+
+
+def _place(rng: random.Random, fresh: Optional[str]) -> dict:
+    query = f"{rng.choice(QUERIES)} near {rng.choice(CITIES)}"
+    return {"query": f"{query} {fresh}" if fresh else query, "radius": 5000}
+
+
+def _batch(rng: random.Random, fresh: Optional[str]) -> dict:
+    origins = rng.sample(CITIES, 4)
+    suffix = f" {fresh}" if fresh else ""
+    return {"pairs": [{"origin": o + suffix, "destination": d} for o in origins for d in CITIES if d != o]}
+
+
+def _prompt(rng: random.Random, fresh: Optional[str]) -> dict:
+    return {"prompt": f"Suggest a weekend trip from {rng.choice(CITIES)}" + (f" ({fresh})" if fresh else "")}
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "maps-directions": ("/maps/directions", False, _route),
+    "maps-directions-simplified": ("/maps/directions", False, lambda r, f: {**_route(r, f), "geometry": "simplified"}),
+    "maps-directions-batch": ("/maps/directions/batch", False, _batch),
+    "maps-places": ("/maps/places", False, _place),
+    "maps-places-all": ("/maps/places", False, lambda r, f: {**_place(r, f), "limit": 60}),
+    "maps-places-stream": ("/maps/places/stream", True, _place),
+    "chat": ("/chat", False, _prompt),
+    "chat-directions": ("/chat/directions", False, _route),
+    "chat-places": ("/chat/places", False, _place),
+    "chat-directions-stream": ("/chat/directions/stream", True, _route),
+    "chat-places-stream": ("/chat/places/stream", True, _place),
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    concurrency: int
+    duration_s: float
+    requests: int = 0
+    errors: int = 0
+    rps: float = 0.0
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+    ttfb_ms: Dict[str, float] = field(default_factory=dict)
+    status: Dict[str, int] = field(default_factory=dict)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    a = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+            "mean": round(a.mean(), 2), "max": round(a.max(), 2)}
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, concurrency: int, duration: float,
+                       unique: float, seed: int) -> Result:
+    path, streamed, make_body = SCENARIOS[name]
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    status: Dict[str, int] = {}
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def worker(wid: int) -> None:
+        rng = random.Random(seed * 1000 + wid)
+        while time.perf_counter() < deadline:
+            fresh = f"#{seed}-{next(counter)}" if rng.random() < unique else None
+            body = make_body(rng, fresh)
+            t0 = time.perf_counter()
+            first = None
+            try:
+                async with client.stream("POST", path, json=body) as r:
+                    async for _ in r.aiter_raw():
+                        if first is None:
+                            first = time.perf_counter() - t0
+                code = str(r.status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - t0)
+            if streamed and first is not None:
+                ttfbs.append(first)
+            status[code] = status.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    n = len(latencies)
+    return Result(
+        scenario=name,
+        concurrency=concurrency,
+        duration_s=round(elapsed, 2),
+        requests=n,
+        errors=sum(c for s, c in status.items() if not s.startswith("2")),
+        rps=round(n / elapsed, 1) if elapsed else 0.0,
+        latency_ms=_percentiles(latencies),
+        ttfb_ms=_percentiles(ttfbs),
+        status=status,
+    )
+
+
+def print_result(res: Result, baseline: Optional[dict] = None) -> None:
+    def delta(new: float, old: Optional[float]) -> str:
+        if not old:
+            return ""
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    base_lat = (baseline or {}).get("latency_ms", {})
+    print(f"\n{res.scenario}  c={res.concurrency}  {res.requests} req in {res.duration_s}s  "
+          f"errors={res.errors}  status={res.status}")
+    print(f"  {'rps':<6} {res.rps:>10.1f}{delta(res.rps, (baseline or {}).get('rps'))}")
+    for k in ("p50", "p95", "p99", "max"):
+        if k in res.latency_ms:
+            print(f"  {k:<6} {res.latency_ms[k]:>8.1f}ms{delta(res.latency_ms[k], base_lat.get(k))}")
+    if res.ttfb_ms:
+        base_ttfb = (baseline or {}).get("ttfb_ms", {})
+        print(f"  ttfb   p50 {res.ttfb_ms['p50']:.1f}ms{delta(res.ttfb_ms['p50'], base_ttfb.get('p50'))}"
+              f"  p95 {res.ttfb_ms['p95']:.1f}ms{delta(res.ttfb_ms['p95'], base_ttfb.get('p95'))}")
+
+
+async def _wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            with contextlib.suppress(httpx.HTTPError):
+                if (await client.get(url)).status_code < 500:
+                    return
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+@contextlib.contextmanager
+def local_stack(api_port: int, fake_port: int, fake_args: List[str], log_path: Optional[str] = None) -> Iterator[str]:
+    """Start fake upstreams + the API as subprocesses; yields the API base URL."""
+    api_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {
+        **os.environ,
+        "GOOGLE_MAPS_API_KEY": os.environ.get("GOOGLE_MAPS_API_KEY", "benchmark"),
+        "GOOGLE_MAPS_BASE_URL": f"http://127.0.0.1:{fake_port}/maps/api",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "OLLAMA_BASE_URLS": "",
+        "RATE_LIMIT_PER_MINUTE": "0",
+        # The fake accepts page tokens at once; keep a short wait so paging still overlaps
+        "PLACES_PAGE_TOKEN_DELAY": os.environ.get("PLACES_PAGE_TOKEN_DELAY", "0.2"),
+        "REDIS_URL": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0"),
+    }
+    # The API logs every upstream call at INFO; keep that out of the report
+    log = open(log_path or os.devnull, "w")
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), *fake_args],
+                         cwd=api_dir, env=env, stdout=log, stderr=subprocess.STDOUT),
+        subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port),
+                          "--log-level", "warning", "--no-access-log"],
+                         cwd=api_dir, env=env, stdout=log, stderr=subprocess.STDOUT),
+    ]
+    try:
+        asyncio.run(_wait_ready(f"http://127.0.0.1:{fake_port}/api/tags"))
+        asyncio.run(_wait_ready(f"http://127.0.0.1:{api_port}/health"))
+        yield f"http://127.0.0.1:{api_port}"
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                p.wait(timeout=10)
+        log.close()
+
+
+async def run_all(args: argparse.Namespace, base_url: str) -> List[Result]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        results = []
+        for name in args.scenario:
+            if args.warmup:
+                await run_scenario(client, name, args.concurrency, args.warmup, args.unique, args.seed + 1)
+            results.append(await run_scenario(client, name, args.concurrency, args.duration, args.unique, args.seed))
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="repeatable; default: maps-directions, maps-places, chat-directions")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--unique", type=float, default=0.0, help="fraction of requests with a fresh cache key")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write results as JSON (a baseline for --compare)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--local", action="store_true", help="start fake upstreams + API locally")
+    parser.add_argument("--api-port", type=int, default=8077)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--fake-args", default="", help='extra fake_upstreams flags, e.g. "--latency-ms 120"')
+    parser.add_argument("--stack-log", help="with --local: write API / fake upstream output here")
+    args = parser.parse_args()
+    args.scenario = args.scenario or ["maps-directions", "maps-places", "chat-directions"]
+
+    baseline: Dict[str, dict] = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    if args.local:
+        with local_stack(args.api_port, args.fake_port, args.fake_args.split(), args.stack_log) as base_url:
+            results = asyncio.run(run_all(args, base_url))
+    else:
+        results = asyncio.run(run_all(args, args.base_url))
+
+    for res in results:
+        print_result(res, baseline.get(res.scenario))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "results": [asdict(r) for r in results]}, f, indent=2)
+        print(f"\nsaved {args.save}")
+
+
+if __name__ == "__main__":
+    main()
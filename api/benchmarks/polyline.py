@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: polyline decode + simplification on large multi-leg routes.
+
+    cd api && python -m benchmarks.polyline [--points 200000] [--legs 8]
+
+Compares the NumPy decoder in services.geometry with a straightforward
+pure-Python decoder (what every consumer used to write themselves).
+"""
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from services import geometry as geo
+
+
+def decode_polyline_py(encoded: str) -> List[Tuple[float, float]]:
+    coords, index, lat, lng = [], 0, 0, 0
+    while index < len(encoded):
+        for axis in (0, 1):
+            shift, result = 0, 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if axis == 0:
+                lat += delta
+            else:
+                lng += delta
+        coords.append((lat / 1e5, lng / 1e5))
+    return coords
+
+
+def synthetic_route(points: int, legs: int, seed: int = 7) -> str:
+    """Random-walk route through `legs` waypoints around Java (Jakarta -> Surabaya-ish)."""
+    rng = np.random.default_rng(seed)
+    waypoints = np.linspace([-6.2, 106.8], [-7.25, 112.75], legs + 1)
+    per_leg = max(points // legs, 2)
+    segments = []
+    for a, b in zip(waypoints[:-1], waypoints[1:]):
+        base = np.linspace(a, b, per_leg)
+        jitter = np.cumsum(rng.normal(0, 0.0004, base.shape), axis=0)
+        jitter -= np.linspace(jitter[0], jitter[-1], per_leg)  # pin leg ends to the waypoints
+        segments.append(base + jitter)
+    return geo.encode_polyline(np.concatenate(segments))
+
+
+def bench(label: str, fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm-up
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<34} {best * 1000:9.2f} ms")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--legs", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    encoded = synthetic_route(args.points, args.legs)
+    coords = geo.decode_polyline(encoded)
+    print(f"route: {len(coords)} points, {len(encoded) / 1024:.0f} KiB encoded, "
+          f"{geo.path_length_m(coords) / 1000:.0f} km\n")
+
+    py = bench("decode (pure Python)", lambda: decode_polyline_py(encoded), args.repeat)
+    np_t = bench("decode (NumPy)", lambda: geo.decode_polyline(encoded), args.repeat)
+    print(f"{'speed-up':<34} {py / np_t:9.1f} x\n")
+
+    bench("bbox + length", lambda: (geo.bounding_box(coords), geo.path_length_m(coords)), args.repeat)
+    bench("encode (NumPy)", lambda: geo.encode_polyline(coords), args.repeat)
+    for zoom in (8, 10, 12, 14):
+        simplified = geo.simplify_for_zoom(coords, zoom)
+        bench(f"simplify zoom={zoom} -> {len(simplified)} pts", lambda z=zoom: geo.simplify_for_zoom(coords, z), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Micro-benchmark: per-request CPU of /maps response serialization.
+
+    cd api && python -m benchmarks.serialization [--requests 300] [--points 2000]
+
+Serves the same result objects from a throwaway FastAPI app two ways and
+drives it in-process (httpx ASGITransport, no sockets):
+
+- default: the handler returns the model, FastAPI applies response_model
+  (model_dump, re-validation, serialization, json.dumps) - the old path;
+- fast: the handler returns utils.serialization.render() - JSON, MessagePack
+  (Accept: application/msgpack) and gzip (Accept-Encoding) variants.
+
+Reports process CPU time per request (client and server share the process,
+so the gzip rows include decompression) and body size on the wire. A second
+table compares the raw encoders (pydantic-core, orjson, msgpack) when
+installed.
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from pydantic import BaseModel
+
+from benchmarks.polyline import synthetic_route
+from models.schemas import (DirectionsBatchResult, DirectionsLeg, DirectionsResult, MatrixElement, PlaceItem,
+                            PlacesResult)
+from services.maps_service import route_geometry
+from utils import serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def payloads(points: int) -> Dict[str, BaseModel]:
+    legs = [
+        DirectionsLeg(distance_text="48.2 km", duration_text="1 hour 2 mins", start_address=f"Jl. Waypoint {i}, Jawa Barat",
+                      end_address=f"Jl. Waypoint {i + 1}, Jawa Barat", distance_meters=48200, duration_seconds=3720)
+        for i in range(4)
+    ]
+    poly = synthetic_route(points, len(legs))
+    route = dict(overview_polyline=poly, legs=legs, maps_url="https://www.google.com/maps/dir/?api=1",
+                 total_distance_meters=192800, total_duration_seconds=14880)
+    places = [PlaceItem(name=f"Kopi Kenangan {i}", address=f"Jl. Pahlawan Seribu No.{i}, BSD, Tangerang Selatan",
+                        place_id=f"ChIJ{i:08d}abcdefgh", lat=-6.3 + i * 1e-3, lng=106.65 + i * 1e-3) for i in range(10)]
+    matrix = [MatrixElement(origin=f"Origin {i}", destination=f"Destination {j}", status="OK", distance_text="12.3 km",
+                            duration_text="25 mins", distance_meters=12300, duration_seconds=1500)
+              for i in range(10) for j in range(10)]
+    return {
+        "directions": DirectionsResult(**route),
+        f"directions+full ({points} pts)": DirectionsResult(**route, geometry=route_geometry(poly, "full")),
+        "directions+delta": DirectionsResult(**route, geometry=route_geometry(poly, "delta", 12)),
+        "places (10)": PlacesResult(items=places),
+        "batch (100 pairs)": DirectionsBatchResult(mode="driving", results=matrix, upstream_calls=1),
+    }
+
+
+def _handlers(result: BaseModel):
+    # Closures, not default arguments: FastAPI would treat those as query parameters
+    async def default():
+        return result
+
+    async def fast(request: Request):
+        return serialization.render(request, result)
+
+    return default, fast
+
+
+def build_app(results: Dict[str, BaseModel]) -> FastAPI:
+    app = FastAPI()
+    for i, result in enumerate(results.values()):
+        default, fast = _handlers(result)
+        app.add_api_route(f"/default/{i}", default, methods=["GET"], response_model=type(result))
+        app.add_api_route(f"/fast/{i}", fast, methods=["GET"], response_model=type(result))
+    return app
+
+
+VARIANTS: List[Tuple[str, str, Dict[str, str]]] = [
+    ("default (response_model)", "default", {}),
+    ("fast json", "fast", {}),
+    ("fast msgpack", "fast", {"accept": "application/msgpack"}),
+    ("fast json + gzip", "fast", {"accept-encoding": "gzip"}),
+]
+
+
+async def measure(client: httpx.AsyncClient, path: str, headers: Dict[str, str], n: int) -> Tuple[float, int]:
+    r = await client.get(path, headers=headers)  # warm-up
+    r.raise_for_status()
+    size = len(r.content) if "content-encoding" not in r.headers else int(r.headers.get("content-length", 0))
+    cpu = time.process_time()
+    for _ in range(n):
+        await client.get(path, headers=headers)
+    return (time.process_time() - cpu) / n, size
+
+
+async def run(results: Dict[str, BaseModel], n: int) -> None:
+    transport = httpx.ASGITransport(app=build_app(results))
+    # Compressed bodies are left as-is so their wire size can be reported
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"accept-encoding": "identity"}) as client:
+        print(f"{'payload':<28} {'variant':<26} {'CPU/request':>12} {'bytes':>9} {'vs default':>11}")
+        for i, name in enumerate(results):
+            base = None
+            for label, kind, headers in VARIANTS:
+                if "msgpack" in label and serialization.msgpack is None:
+                    continue
+                cpu, size = await measure(client, f"/{kind}/{i}", headers, n)
+                base = base or cpu
+                print(f"{name:<28} {label:<26} {cpu * 1e6:9.0f} µs {size:9d} {base / cpu:10.1f}x")
+            print()
+
+
+def bench(label: str, fn: Callable[[], object], repeat: int) -> None:
+    fn()
+    t0 = time.process_time()
+    for _ in range(repeat):
+        fn()
+    print(f"{label:<40} {(time.process_time() - t0) / repeat * 1e6:9.0f} µs")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="requests per payload/variant")
+    parser.add_argument("--points", type=int, default=2000, help="route points in the geometry payloads")
+    args = parser.parse_args()
+
+    results = payloads(args.points)
+    asyncio.run(run(results, args.requests))
+
+    print("encoders only:")
+    for name, result in results.items():
+        bench(f"{name}: pydantic-core json", result.model_dump_json, args.requests)
+        if orjson is not None:
+            bench(f"{name}: orjson(model_dump())", lambda r=result: orjson.dumps(r.model_dump()), args.requests)
+        if serialization.msgpack is not None:
+            bench(f"{name}: msgpack(model_dump())",
+                  lambda r=result: serialization.encode(r, serialization.MSGPACK), args.requests)
+
+
+if __name__ == "__main__":
+    main()
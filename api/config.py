@@ -12,13 +12,140 @@ class Settings(BaseSettings):
     # Ollama
     OLLAMA_BASE_URL: str = "http://ollama:11434"
     OLLAMA_MODEL: str = "llama3.2:3b"
+    # Optional comma-separated list of Ollama hosts; overrides OLLAMA_BASE_URL when set
+    OLLAMA_BASE_URLS: str = ""
+    OLLAMA_HEALTH_INTERVAL: float = 15.0
+    OLLAMA_EVICT_AFTER_FAILURES: int = 2
+    # Model residency: keep_alive sent with every generate call, models loaded at
+    # startup (OLLAMA_MODEL + comma-separated extras) and re-pinged while idle
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_WARM_MODELS: str = ""
+    OLLAMA_KEEP_WARM_INTERVAL: float = 600.0
+    OLLAMA_MODELS_CACHE_TTL: float = 60.0
+    # Admission control: concurrent generations per backend, and queue depth at which
+    # optional enrichment (chat_directions / chat_places) is shed
+    OLLAMA_MAX_CONCURRENCY: int = 2
+    OLLAMA_SHED_QUEUE_DEPTH: int = 4
+    # Max seconds chat_directions / chat_places wait for the optional AI text
+    LLM_ENRICH_BUDGET_SECONDS: float = 3.0
 
     # Google Maps (must be provided via .env; keep default empty to avoid leaking)
     GOOGLE_MAPS_API_KEY: str = ""
     GOOGLE_MAPS_BASE_URL: str = "https://maps.googleapis.com/maps/api"
 
+    # Upstream HTTP connection pools (shared clients, see services/http_clients.py)
+    GOOGLE_HTTP2: bool = True
+    GOOGLE_MAX_CONNECTIONS: int = 50
+    GOOGLE_MAX_KEEPALIVE: int = 20
+    OLLAMA_MAX_CONNECTIONS: int = 10
+    OLLAMA_MAX_KEEPALIVE: int = 5
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+
+    # Response caches (in-process LRU in front of Redis)
+    CACHE_ENABLED: bool = True
+    DIRECTIONS_CACHE_SIZE: int = 1024
+    DIRECTIONS_CACHE_TTL: int = 3600
+    DIRECTIONS_CACHE_REDIS_TTL: int = 86400
+    MATRIX_CACHE_SIZE: int = 8192
+    MATRIX_CACHE_TTL: int = 3600
+    MATRIX_CACHE_REDIS_TTL: int = 86400
+    PLACES_CACHE_SIZE: int = 2048
+    PLACES_CACHE_TTL: int = 900
+    PLACES_CACHE_REDIS_TTL: int = 3600
+    OLLAMA_CACHE_SIZE: int = 1024
+    OLLAMA_CACHE_TTL: int = 3600
+    OLLAMA_CACHE_REDIS_TTL: int = 21600
+    # Chat sessions (Ollama context per session_id): idle sessions expire after the TTL,
+    # least recently used ones are evicted past CHAT_SESSION_MAX per process
+    CHAT_SESSION_MAX: int = 1000
+    CHAT_SESSION_TTL: int = 1800
+    CHAT_SESSION_REDIS_TTL: int = 1800
+    CHAT_SESSION_MAX_CONTEXT: int = 8192  # tokens; longer sessions start over
+    # Stale-while-revalidate: expired entries are still served (and refreshed in the
+    # background) for this long
+    DIRECTIONS_CACHE_STALE_TTL: int = 86400
+    PLACES_CACHE_STALE_TTL: int = 3600
+    # Paged Text Search (limit / POST /maps/places/stream): Google returns up to 3 pages
+    # of 20 and only accepts a next_page_token after a short delay
+    PLACES_MAX_RESULTS: int = 60
+    PLACES_PAGE_TOKEN_DELAY: float = 2.0
+    PLACES_PAGE_TOKEN_RETRIES: int = 3
+    PLACES_ALL_CACHE_SIZE: int = 512
+    # Place Details enrichment (ratings + opening hours for the top results), cached per
+    # place_id; fetched concurrently and only waited for up to the budget
+    PLACE_DETAILS_ENABLED: bool = True
+    PLACE_DETAILS_TOP_N: int = 5
+    PLACE_DETAILS_CONCURRENCY: int = 5
+    PLACE_DETAILS_BUDGET_SECONDS: float = 1.5
+    PLACE_DETAILS_CACHE_SIZE: int = 4096
+    PLACE_DETAILS_CACHE_TTL: int = 86400
+    PLACE_DETAILS_CACHE_REDIS_TTL: int = 604800
+    PLACE_DETAILS_CACHE_STALE_TTL: int = 604800
+    # Geohash cell width as a fraction of the search radius (smaller = finer buckets)
+    PLACES_CACHE_CELL_FRACTION: float = 0.25
+
+    # Google Maps resilience: jittered retries for transient failures (network, 429/5xx)
+    # and a per-endpoint circuit breaker that fails fast while the error rate is high
+    GOOGLE_RETRIES: int = 2
+    GOOGLE_RETRY_BASE_DELAY: float = 0.2
+    GOOGLE_RETRY_MAX_DELAY: float = 2.0
+    GOOGLE_BREAKER_ERROR_RATE: float = 0.5
+    GOOGLE_BREAKER_MIN_CALLS: int = 10
+    GOOGLE_BREAKER_WINDOW: float = 30.0
+    GOOGLE_BREAKER_OPEN_SECONDS: float = 15.0
+    GOOGLE_TIMEOUT: float = 30.0
+    # Hedged requests (off by default: a hedge is a second billed call): an attempt still
+    # pending after the endpoint's recent p95 gets a duplicate, first answer wins.
+    # At most GOOGLE_HEDGE_MAX_RATIO of calls are hedged.
+    GOOGLE_HEDGE_ENABLED: bool = False
+    GOOGLE_HEDGE_QUANTILE: float = 0.95
+    GOOGLE_HEDGE_MIN_SAMPLES: int = 20
+    GOOGLE_HEDGE_MAX_RATIO: float = 0.1
+
+    # End-to-end request deadlines (utils/deadline.py): seconds from the header (capped
+    # at REQUEST_DEADLINE_MAX), else the per-route default ("path=seconds,..."), else
+    # REQUEST_DEADLINE_DEFAULT (0 = none). Maps/Ollama timeouts and retries shrink to fit.
+    REQUEST_DEADLINE_HEADER: str = "X-Request-Timeout"
+    REQUEST_DEADLINE_ROUTES: str = (
+        "/chat=90,/chat/directions=20,/chat/places=20,/maps/directions=15,/maps/places=15,/maps/directions/batch=60"
+    )
+    REQUEST_DEADLINE_DEFAULT: float = 0.0
+    REQUEST_DEADLINE_MAX: float = 120.0
+
+    # Rendered HTML (/ui, /maps/*/view): in-process page cache + browser Cache-Control
+    VIEW_CACHE_SIZE: int = 512
+    VIEW_CACHE_TTL: int = 3600
+    VIEW_MAX_AGE: int = 300
+    UI_MAX_AGE: int = 300
+
+    # Place-name index for /maps/autocomplete: extra TSV files (comma-separated) on top
+    # of data/gazetteer.tsv, and how many names to pick up from Places results
+    GAZETTEER_PATH: str = ""
+    GAZETTEER_LEARN: bool = True
+    GAZETTEER_MAX_LEARNED: int = 20000
+    AUTOCOMPLETE_MAX_LIMIT: int = 20
+
+    # Spatial index of seen places: nearby searches inside a freshly covered circle
+    # (same query) are answered locally instead of calling Text Search
+    PLACE_INDEX_ENABLED: bool = True
+    PLACE_INDEX_CELL_DEG: float = 0.01
+    PLACE_INDEX_TTL: int = 86400
+    PLACE_INDEX_COVERAGE_TTL: int = 900
+    PLACE_INDEX_MAX_PLACES: int = 50000
+    PLACE_INDEX_MIN_RESULTS: int = 3
+
+    # /maps JSON/MessagePack responses at least this big are gzip/brotli compressed
+    MAPS_COMPRESS_MIN_BYTES: int = 4096
+
+    # Batch travel times (POST /maps/directions/batch)
+    MAPS_BATCH_MAX_PAIRS: int = 500
+    MAPS_BATCH_CONCURRENCY: int = 4
+
     # Rate limit
     RATE_LIMIT_PER_MINUTE: int = 60
+    # How often local token buckets reconcile with the shared Redis counters
+    RATE_LIMIT_SYNC_INTERVAL: float = 1.0
     REDIS_URL: str = "redis://redis:6379/0"
 
     model_config = SettingsConfigDict(
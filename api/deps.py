@@ -1,11 +1,38 @@
-from fastapi import Depends
-from fastapi_limiter.depends import RateLimiter
-from config import get_settings  
+import math
+from fastapi import HTTPException, Request
+from utils.metrics import RATE_LIMIT_REJECTIONS, route_label
+from utils.rate_limit import limiter
+from utils.deadline import DeadlineExceeded
+from utils.resilience import CircuitOpenError
 
-def limiter_dep():
-    settings = get_settings()
-    return RateLimiter(times=settings.RATE_LIMIT_PER_MINUTE, seconds=60)
 
-def get_rate_limiter(limit=Depends(limiter_dep)):
-    # dummy dependency, hanya untuk inject limiter ke route
-    return limit
+def client_key(request: Request) -> str:
+    # Same identity as before (first X-Forwarded-For hop or peer IP) + path
+    forwarded = request.headers.get("X-Forwarded-For")
+    ip = forwarded.split(",")[0].strip() if forwarded else (request.client.host if request.client else "unknown")
+    return f"{ip}:{request.scope['path']}"
+
+
+async def get_rate_limiter(request: Request):
+    allowed, retry_after = limiter.hit(client_key(request))
+    if not allowed:
+        RATE_LIMIT_REJECTIONS.labels(route_label(request.scope)).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too Many Requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def upstream_unavailable(e: CircuitOpenError) -> HTTPException:
+    """503 + Retry-After for calls short-circuited by an open breaker."""
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+def deadline_exceeded(e: DeadlineExceeded) -> HTTPException:
+    """504 when the request deadline ran out while waiting on an upstream."""
+    return HTTPException(status_code=504, detail=str(e))
@@ -1,32 +1,84 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 # ----- Chat -----
 class ChatRequest(BaseModel):
     prompt: str = Field(..., min_length=1, description="User prompt")
     model: Optional[str] = Field(None, description="Optional Ollama model name, e.g. 'llama3.2:3b'")
+    cache: bool = Field(True, description="Reuse a cached answer for an identical prompt; set false to force a fresh generation")
+    session: bool = Field(False, description="Start a multi-turn session; the response carries its session_id")
+    session_id: Optional[str] = Field(
+        None, pattern=r"^[0-9a-f]{32}$",
+        description="Continue a session issued by the server: the turn reuses its Ollama context (cache is not used)",
+    )
 
 class ChatResponse(BaseModel):
     model: str
     content: str
+    session_id: Optional[str] = None
 
 # ----- Maps: Directions -----
 class DirectionsRequest(BaseModel):
     origin: str = Field(..., description="Alamat/koordinat asal (e.g. 'Jakarta')")
     destination: str = Field(..., description="Alamat/koordinat tujuan")
     mode: Optional[str] = Field("driving", description="driving|walking|bicycling|transit")
+    waypoints: Optional[List[str]] = Field(None, max_length=25, description="Titik singgah berurutan (opsional, maks 25)")
     model: Optional[str] = Field(None, description="Optional LLM model for summarization")
+    llm_budget: Optional[float] = Field(None, ge=0, description="Max seconds to wait for the AI summary (capped by server config)")
+    geometry: Optional[Literal["full", "simplified", "delta"]] = Field(
+        None, description="Optional decoded route geometry: full points, zoom-simplified points, or simplified E5 deltas"
+    )
+    zoom: Optional[int] = Field(10, ge=0, le=21, description="Target map zoom for geometry=simplified|delta")
 
 class DirectionsLeg(BaseModel):
     distance_text: str
     duration_text: str
     start_address: str
     end_address: str
+    distance_meters: int = 0
+    duration_seconds: int = 0
+
+class RouteGeometry(BaseModel):
+    format: str = Field(..., description="full|simplified|delta")
+    zoom: Optional[int] = None
+    point_count: int
+    original_point_count: int
+    bbox: List[float] = Field(..., description="[south, west, north, east]")
+    length_meters: float
+    points: Optional[List[List[float]]] = Field(None, description="[[lat, lng], ...] for full/simplified")
+    polyline: Optional[str] = Field(None, description="Encoded polyline of the returned points")
+    deltas: Optional[List[int]] = Field(None, description="[lat0, lng0, dlat1, dlng1, ...] in 1e-5 degrees (delta format)")
 
 class DirectionsResult(BaseModel):
     overview_polyline: Optional[str] = None
     legs: List[DirectionsLeg] = []
     maps_url: str
+    total_distance_meters: int = 0
+    total_duration_seconds: int = 0
+    geometry: Optional[RouteGeometry] = None
+
+# ----- Maps: Batch travel times (Distance Matrix) -----
+class RoutePair(BaseModel):
+    origin: str
+    destination: str
+
+class DirectionsBatchRequest(BaseModel):
+    pairs: List[RoutePair] = Field(..., min_length=1, description="Pasangan origin/destination")
+    mode: Optional[str] = Field("driving", description="driving|walking|bicycling|transit")
+
+class MatrixElement(BaseModel):
+    origin: str
+    destination: str
+    status: str = Field(..., description="Distance Matrix element status, e.g. OK, NOT_FOUND, ZERO_RESULTS; UPSTREAM_ERROR, UNAVAILABLE or DEADLINE_EXCEEDED when its upstream call failed")
+    distance_text: Optional[str] = None
+    duration_text: Optional[str] = None
+    distance_meters: Optional[int] = None
+    duration_seconds: Optional[int] = None
+
+class DirectionsBatchResult(BaseModel):
+    mode: str
+    results: List[MatrixElement]
+    upstream_calls: int = Field(0, description="Distance Matrix requests made (cached pairs cost none)")
 
 # ----- Maps: Places (simple textsearch/nearby) -----
 class PlacesRequest(BaseModel):
@@ -34,11 +86,34 @@ class PlacesRequest(BaseModel):
     location: Optional[str] = Field(None, description="lat,lng (opsional)")
     radius: Optional[int] = Field(5000, description="radius meter (opsional)")
     model: Optional[str] = Field(None, description="Optional LLM model for summarization")
+    llm_budget: Optional[float] = Field(None, ge=0, description="Max seconds to wait for the AI recommendation (capped by server config)")
+    details: bool = Field(False, description="Tambah rating & jam buka (Place Details) untuk hasil teratas")
+    limit: Optional[int] = Field(
+        None, ge=1, le=60, description="Ambil sampai `limit` hasil lewat next_page_token (maks 60); default 10 hasil halaman pertama"
+    )
 
 class PlaceItem(BaseModel):
     name: str
     address: Optional[str] = None
     place_id: Optional[str] = None
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    rating: Optional[float] = None
+    user_ratings_total: Optional[int] = None
+    open_now: Optional[bool] = Field(None, description="Dari jam buka Place Details (hanya jika details diminta)")
+    opening_hours: Optional[List[str]] = Field(None, description="Jam buka per hari, mis. 'Monday: 8:00 AM – 10:00 PM'")
 
 class PlacesResult(BaseModel):
     items: List[PlaceItem]
+
+class PlacesPage(BaseModel):
+    page: int = Field(..., description="0-based page number (one NDJSON line per page)")
+    items: List[PlaceItem]
+
+class AutocompleteSuggestion(BaseModel):
+    name: str
+    kind: str = Field(..., description="city|area|region|landmark|airport|station|place")
+
+class AutocompleteResult(BaseModel):
+    query: str
+    suggestions: List[AutocompleteSuggestion]
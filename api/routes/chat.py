@@ -1,215 +1,312 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+import json
 import logging
 from urllib.parse import quote_plus
-from typing import List, Dict, Any
-import httpx
+from typing import List, Dict, Any, AsyncIterator, Optional
 from config import get_settings
 from models.schemas import ChatRequest, ChatResponse
-from services.ollama_service import generate_with_ollama
-from services.maps_service import directions as maps_directions, text_search_places as maps_places, build_gmaps_directions_url, normalize_mode
-from models.schemas import DirectionsRequest, PlacesRequest
-from deps import get_rate_limiter
+from services.ollama_service import UnknownSession, generate_with_ollama, open_session, session_store, stream_with_ollama
+from services.ollama_scheduler import PRIORITY_ENRICHMENT
+from services.ollama_pool import pool as ollama_pool
+from services.maps_service import (directions as maps_directions, text_search_places as maps_places, enrich_places, build_gmaps_directions_url,
+                                  normalize_mode, route_totals, format_duration)
+from models.schemas import DirectionsRequest, PlaceItem, PlacesRequest
+from deps import deadline_exceeded, get_rate_limiter, upstream_unavailable
+from utils import deadline
+from utils.deadline import DeadlineExceeded
+from utils.resilience import CircuitOpenError
+from utils.background import await_within, spawn
 
 router = APIRouter(tags=["chat"])
 
 @router.get("/models")
 async def list_models() -> List[Dict[str, Any]]:
-    """Return available local Ollama models (tags)."""
-    settings = get_settings()
-    url = f"{settings.OLLAMA_BASE_URL}/api/tags"
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        data = r.json() or {}
-        # Ollama returns {"models": [{"name": "llama3.2:3b", ...}, ...]}
-        return data.get("models", [])
+    """Return available local Ollama models (tags), merged across healthy backends."""
+    # Served from the catalogue kept by the pool's health probes. Once it is older
+    # than the TTL it is still served while one (coalesced) re-probe runs in the
+    # background; only a never-loaded catalogue is waited for
+    if ollama_pool.catalogue_age() > get_settings().OLLAMA_MODELS_CACHE_TTL:
+        if ollama_pool.catalogue_at:
+            spawn(ollama_pool.refresh(timeout=30), name="ollama-tags-refresh")
+        else:
+            await ollama_pool.refresh(timeout=30)
+    if not ollama_pool.healthy:
+        raise HTTPException(status_code=502, detail="No Ollama backend available")
+    # Ollama returns {"models": [{"name": "llama3.2:3b", ...}, ...]}
+    return ollama_pool.catalogue()
 
 @router.post("", response_model=ChatResponse, dependencies=[Depends(get_rate_limiter)])
 async def chat(req: ChatRequest):
+    session_id = await _session(req)
     try:
-        content = await generate_with_ollama(req.prompt, model=req.model)
-        return ChatResponse(model=req.model or "ollama", content=content)
+        content = await generate_with_ollama(req.prompt, model=req.model, use_cache=req.cache, session_id=session_id)
+        return ChatResponse(model=req.model or "ollama", content=content, session_id=session_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ollama error: {e}")
 
-@router.post("/directions", response_model=ChatResponse, dependencies=[Depends(get_rate_limiter)])
-async def chat_directions(req: DirectionsRequest):
+async def _session(req: ChatRequest) -> Optional[str]:
+    """The session this turn belongs to: a new one for `session=true`, else the issued `session_id` (404 if unknown)."""
+    if req.session_id is None and not req.session:
+        return None
     try:
-        settings = get_settings()
-        safe_mode = normalize_mode(req.mode or "driving")
-        
-        # STEP 1: Always try to get maps data first (this is fast and reliable)
-        poly_legs = await maps_directions(req.origin, req.destination, safe_mode)
-        url = build_gmaps_directions_url(req.origin, req.destination, safe_mode)
-        
-        # HTML view link (embed) for quick open in browser
-        view_link_path = (
-            f"/maps/directions/view?origin={quote_plus(req.origin)}&destination={quote_plus(req.destination)}&mode={quote_plus(safe_mode)}"
-        )
-        view_link = settings.API_BASE_URL.rstrip('/') + view_link_path
-        
-        # If no route found, return immediately with Google Maps link
-        if not poly_legs:
-            summary = (
-                "🗺️ Route not found via Google Maps API.\n\n"
-                "📍 Namun Anda masih bisa cek rute manual di:\n"
-                f"- Google Maps: {url}\n"
-                f"- View on Map (embed): {view_link}\n\n"
-                "💡 Tips: Check location spelling or use more specific names."
-            )
-            return ChatResponse(model="maps+fallback", content=summary)
-        poly, legs = poly_legs
-        # Buat prompt singkat untuk LLM berdasarkan legs
-        steps = "\n".join([f"- {leg.start_address} → {leg.end_address} ({leg.distance_text}, {leg.duration_text})" for leg in legs])
-        prompt = (
-            "Ringkas rute ini dalam 3-4 kalimat singkat:\n"
-            f"{steps}\n"
-            "Answer in English."
+        return await open_session(req.session_id)
+    except UnknownSession:
+        raise HTTPException(status_code=404, detail="Unknown or expired session_id; start a new session")
+
+@router.delete("/sessions/{session_id}", status_code=204)
+async def end_session(session_id: str):
+    """Forget a chat session (its id is no longer accepted)."""
+    await session_store.delete(session_id)
+
+# ----- Shared reply builders (used by both JSON and streaming endpoints) -----
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _stream_reply(reply: Dict[str, Any], model: Optional[str]) -> AsyncIterator[str]:
+    """
+    SSE sequence: `base` (deterministic maps block, flushed first), then `token`
+    events for the LLM enrichment, then `links`, then `done`.
+    """
+    if reply.get("fallback"):
+        yield _sse("base", {"model": "maps+fallback", "content": reply["fallback"]})
+        yield _sse("done", {"model": "maps+fallback"})
+        return
+    yield _sse("base", {"model": "maps", "content": reply["base"], "label": reply["label"]})
+    got_tokens = False
+    async for chunk in stream_with_ollama(reply["prompt"], model=model, use_cache=True, priority=PRIORITY_ENRICHMENT):
+        got_tokens = True
+        yield _sse("token", {"content": chunk})
+    yield _sse("links", {"content": reply["links"]})
+    yield _sse("done", {"model": "maps+llm" if got_tokens else "maps"})
+
+def _start_enrichment(prompt: str, model: Optional[str]):
+    """Kick off the LLM enrichment immediately so it overlaps with formatting."""
+    return spawn(
+        generate_with_ollama(prompt, model=model, max_retries=0, use_cache=True, priority=PRIORITY_ENRICHMENT),
+        name="llm-enrichment",
+    )
+
+def _enrich_budget(requested: Optional[float]) -> float:
+    """Per-request budget (seconds), never above the configured cap or the time left."""
+    cap = deadline.timeout_for(get_settings().LLM_ENRICH_BUDGET_SECONDS)
+    return cap if requested is None else max(0.0, min(requested, cap))
+
+async def _directions_reply(req: DirectionsRequest, enrich: bool = False) -> Dict[str, Any]:
+    settings = get_settings()
+    safe_mode = normalize_mode(req.mode or "driving")
+
+    # STEP 1: Always try to get maps data first (this is fast and reliable)
+    poly_legs = await maps_directions(req.origin, req.destination, safe_mode, req.waypoints)
+    url = build_gmaps_directions_url(req.origin, req.destination, safe_mode, req.waypoints)
+
+    # HTML view link (embed) for quick open in browser
+    view_link_path = (
+        f"/maps/directions/view?origin={quote_plus(req.origin)}&destination={quote_plus(req.destination)}&mode={quote_plus(safe_mode)}"
+    )
+    if req.waypoints:
+        view_link_path += f"&waypoints={quote_plus('|'.join(req.waypoints))}"
+    view_link = settings.API_BASE_URL.rstrip('/') + view_link_path
+
+    # If no route found, return immediately with Google Maps link
+    if not poly_legs:
+        summary = (
+            "🗺️ Route not found via Google Maps API.\n\n"
+            "📍 Namun Anda masih bisa cek rute manual di:\n"
+            f"- Google Maps: {url}\n"
+            f"- View on Map (embed): {view_link}\n\n"
+            "💡 Tips: Check location spelling or use more specific names."
         )
-        # Calculate basic route info first (guaranteed to work)
-        try:
-            total_distance = sum([float(leg.distance_text.replace(' km', '').replace(',', '.')) for leg in legs if 'km' in leg.distance_text])
-        except:
-            total_distance = 0
-            
-        # Calculate total duration by parsing and summing all legs
-        def parse_duration(duration_text):
-            """Parse duration text like '2 hours 46 mins' or '1 hour 15 mins' to total minutes"""
-            import re
-            # Remove any extra characters and normalize
-            text = duration_text.lower().replace('hours', 'hour').replace('mins', 'min').replace('minutes', 'min')
-            
-            # Extract hours and minutes
-            hours = 0
-            minutes = 0
-            
-            # Look for hour patterns
-            hour_match = re.search(r'(\d+)\s*hours?', text)
-            if hour_match:
-                hours = int(hour_match.group(1))
-            
-            # Look for minute patterns
-            min_match = re.search(r'(\d+)\s*mins?', text)
-            if min_match:
-                minutes = int(min_match.group(1))
-            
-            return hours * 60 + minutes
-        
-        def format_duration(total_minutes):
-            """Format total minutes back to readable format"""
-            if total_minutes < 60:
-                return f"{total_minutes} min"
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            if minutes == 0:
-                return f"{hours} hour{'s' if hours > 1 else ''}"
-            return f"{hours} hour{'s' if hours > 1 else ''} {minutes} min"
-        
-        # Sum all leg durations
-        total_minutes = 0
-        try:
-            for leg in legs:
-                total_minutes += parse_duration(leg.duration_text)
-            total_duration = format_duration(total_minutes)
-        except:
-            total_duration = legs[0].duration_text if legs else "Unknown"
-        
-        # Transportation mode icons and labels
-        mode_info = {
-            'driving': {'icon': '🚗', 'label': 'driving'},
-            'walking': {'icon': '🚶', 'label': 'walking'},
-            'bicycling': {'icon': '🚴', 'label': 'bicycling'},
-            'transit': {'icon': '🚌', 'label': 'public transit'}
+        return {"fallback": summary}
+    poly, legs = poly_legs
+    # Totals come from the numeric Directions values (metres / seconds), summed over all legs
+    total_meters, total_seconds = route_totals(legs)
+    total_distance = total_meters / 1000
+    total_duration = format_duration(total_seconds)
+    # Much shorter prompt for faster processing
+    simple_prompt = f"Summary: route from {req.origin} to {req.destination}, {total_distance:.1f}km. 1-2 sentences only. English."
+    llm_task = _start_enrichment(simple_prompt, req.model) if enrich else None
+
+    steps = "\n".join([f"- {leg.start_address} → {leg.end_address} ({leg.distance_text}, {leg.duration_text})" for leg in legs])
+
+    # Transportation mode icons and labels
+    mode_info = {
+        'driving': {'icon': '🚗', 'label': 'driving'},
+        'walking': {'icon': '🚶', 'label': 'walking'},
+        'bicycling': {'icon': '🚴', 'label': 'bicycling'},
+        'transit': {'icon': '🚌', 'label': 'public transit'}
+    }
+    mode_data = mode_info.get(safe_mode, {'icon': '🚗', 'label': safe_mode})
+
+    # Create reliable base content with route data
+    base_content = (
+        f"🗺️ **Route Found: {req.origin} → {req.destination}**\n\n"
+        f"📏 **Distance**: ~{total_distance:.1f} km\n"
+        f"⏱️ **Estimated time**: {total_duration}\n"
+        f"{mode_data['icon']} **Transportation mode**: {mode_data['label']}\n\n"
+        f"**Route Details:**\n{steps}\n\n"
+        "✅ **Route found successfully** - see details on Google Maps or embed map."
+    )
+    links = (
+        "\n\nQuick Links:\n"
+        + f"- [Google Maps]({url})\n"
+        + f"- [View on Map (embed)]({view_link})\n"
+        + "\nRaw links (fallback):\n"
+        + url + "\n" + view_link
+    )
+    return {"base": base_content, "prompt": simple_prompt, "links": links, "label": "AI Summary", "llm_task": llm_task}
+
+def _place_label(it: PlaceItem) -> str:
+    """'Name (4.6★, 1200 reviews, open now)' for the LLM prompt."""
+    facts = []
+    if it.rating is not None:
+        facts.append(f"{it.rating}★")
+    if it.user_ratings_total:
+        facts.append(f"{it.user_ratings_total} reviews")
+    if it.open_now is not None:
+        facts.append("open now" if it.open_now else "closed now")
+    return f"{it.name} ({', '.join(facts)})" if facts else it.name
+
+def _place_badges(it: PlaceItem) -> str:
+    badges = []
+    if it.rating is not None:
+        badges.append(f"⭐ {it.rating}" + (f" ({it.user_ratings_total})" if it.user_ratings_total else ""))
+    if it.open_now is not None:
+        badges.append("🟢 Open now" if it.open_now else "🔴 Closed")
+    return f" · {' · '.join(badges)}" if badges else ""
+
+async def _places_reply(req: PlacesRequest, enrich: bool = False) -> Dict[str, Any]:
+    settings = get_settings()
+
+    # STEP 1: Always try to get places data first (this is fast and reliable)
+    items = await maps_places(req.query, req.location, req.radius)
+    # Ratings / opening hours for the top results: one concurrent round of Place Details, time-boxed
+    if items and settings.PLACE_DETAILS_ENABLED:
+        items = await enrich_places(items)
+
+    # Build view link (include optional center if provided)
+    view_link = settings.API_BASE_URL.rstrip("/") + f"/maps/places/view?q={quote_plus(req.query)}"
+    if req.location:
+        view_link += f"&location={quote_plus(req.location)}"
+
+    # If no places found, return immediately with search link
+    if not items:
+        return {
+            "fallback": (
+                f"🔍 No places found for '{req.query}'.\n\n"
+                "📍 Try looking on the map or change keywords:\n"
+                f"[Lihat di peta (embed)]({view_link})\n\n"
+                "💡 Tips: Gunakan kata kunci yang lebih umum atau ubah lokasi pencarian.\n\n"
+                f"Raw link: {view_link}"
+            ),
         }
-        mode_data = mode_info.get(safe_mode, {'icon': '🚗', 'label': safe_mode})
-        
-        # Create reliable base content with route data
-        base_content = (
-            f"🗺️ **Route Found: {req.origin} → {req.destination}**\n\n"
-            f"📏 **Distance**: ~{total_distance:.1f} km\n"
-            f"⏱️ **Estimated time**: {total_duration}\n"
-            f"{mode_data['icon']} **Transportation mode**: {mode_data['label']}\n\n"
-            f"**Route Details:**\n{steps}\n\n"
-            "✅ **Route found successfully** - see details on Google Maps or embed map."
-        )
-        
-        # Try LLM enhancement but don't block if it fails
-        try:
-            # Much shorter prompt for faster processing
-            simple_prompt = f"Summary: route from {req.origin} to {req.destination}, {total_distance:.1f}km. 1-2 sentences only. English."
-            llm_content = await generate_with_ollama(simple_prompt, model=req.model, max_retries=0)
-            if llm_content and len(llm_content.strip()) > 5:
-                content = f"🤖 **AI Summary**: {llm_content}\n\n{base_content}"
-            else:
-                content = base_content
-        except Exception as le:
-            logging.info(f"LLM enhancement failed, using base content: {le}")
+    # Much shorter prompt for faster processing
+    top_names = [_place_label(it) for it in items[:3]]
+    simple_prompt = f"From: {'; '.join(top_names)}. Choose 2 best, brief reason. English, 1-2 sentences."
+    llm_task = _start_enrichment(simple_prompt, req.model) if enrich else None
+
+    # Create reliable base content with places data (guaranteed to show results)
+    top_places = items[:5]  # Show top 5 places
+    listing = "\n".join([f"• **{it.name}** {f'— {it.address}' if it.address else ''}{_place_badges(it)}" for it in top_places])
+
+    base_content = (
+        f"🔍 **Search '{req.query}' - {len(items)} places found!**\n\n"
+        f"📍 **Top {len(top_places)} Recommendations:**\n{listing}\n\n"
+        f"✅ **Results available** - view all on embed map."
+    )
+    links = (
+        "\n\n[View on Map (embed)](" + view_link + ")"
+        + "\nRaw link: " + view_link
+    )
+    return {"base": base_content, "prompt": simple_prompt, "links": links, "label": "AI Recommendations", "llm_task": llm_task}
+
+async def _complete_reply(reply: Dict[str, Any], budget: float) -> ChatResponse:
+    if reply.get("fallback"):
+        return ChatResponse(model="maps+fallback", content=reply["fallback"])
+    base_content = reply["base"]
+    # Try LLM enhancement but never wait past the latency budget. A generation
+    # that misses the budget keeps running detached and back-fills the
+    # generation cache, so the next identical request gets it instantly.
+    try:
+        llm_content = await await_within(reply["llm_task"], budget)
+        if llm_content is None:
+            logging.info(f"LLM enhancement exceeded {budget}s budget, using base content")
+        if llm_content and len(llm_content.strip()) > 5:
+            content = f"🤖 **{reply['label']}**: {llm_content}\n\n{base_content}"
+        else:
             content = base_content
-        content_with_links = (
-            content
-            + "\n\nQuick Links:\n"
-            + f"- [Google Maps]({url})\n"
-            + f"- [View on Map (embed)]({view_link})\n"
-            + "\nRaw links (fallback):\n"
-            + url + "\n" + view_link
-        )
-        return ChatResponse(model="maps+llm", content=content_with_links)
+    except Exception as le:
+        logging.info(f"LLM enhancement failed, using base content: {le}")
+        content = base_content
+    return ChatResponse(model="maps+llm", content=content + reply["links"])
+
+# ----- Endpoints -----
+
+@router.post("/directions", response_model=ChatResponse, dependencies=[Depends(get_rate_limiter)])
+async def chat_directions(req: DirectionsRequest):
+    try:
+        reply = await _directions_reply(req, enrich=True)
+        return await _complete_reply(reply, _enrich_budget(req.llm_budget))
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat directions error: {e}")
 
 @router.post("/places", response_model=ChatResponse, dependencies=[Depends(get_rate_limiter)])
 async def chat_places(req: PlacesRequest):
     try:
-        settings = get_settings()
-        
-        # STEP 1: Always try to get places data first (this is fast and reliable)
-        items = await maps_places(req.query, req.location, req.radius)
-        
-        # Build view link (include optional center if provided)
-        view_link = settings.API_BASE_URL.rstrip("/") + f"/maps/places/view?q={quote_plus(req.query)}"
-        if req.location:
-            view_link += f"&location={quote_plus(req.location)}"
-            
-        # If no places found, return immediately with search link
-        if not items:
-            return ChatResponse(
-                model="maps+fallback",
-                content=(
-                    f"🔍 No places found for '{req.query}'.\n\n"
-                    "📍 Try looking on the map or change keywords:\n"
-                    f"[Lihat di peta (embed)]({view_link})\n\n"
-                    "💡 Tips: Gunakan kata kunci yang lebih umum atau ubah lokasi pencarian.\n\n"
-                    f"Raw link: {view_link}"
-                ),
-            )
-        # Create reliable base content with places data (guaranteed to show results)
-        top_places = items[:5]  # Show top 5 places
-        listing = "\n".join([f"• **{it.name}** {f'— {it.address}' if it.address else ''}" for it in top_places])
-        
-        base_content = (
-            f"🔍 **Search '{req.query}' - {len(items)} places found!**\n\n"
-            f"📍 **Top {len(top_places)} Recommendations:**\n{listing}\n\n"
-            f"✅ **Results available** - view all on embed map."
-        )
-        
-        # Try LLM enhancement but don't block if it fails
-        try:
-            # Much shorter prompt for faster processing
-            top_names = [it.name for it in items[:3]]
-            simple_prompt = f"From: {', '.join(top_names)}. Choose 2 best, brief reason. English, 1-2 sentences."
-            llm_content = await generate_with_ollama(simple_prompt, model=req.model, max_retries=0)
-            if llm_content and len(llm_content.strip()) > 5:
-                content = f"🤖 **AI Recommendations**: {llm_content}\n\n{base_content}"
-            else:
-                content = base_content
-        except Exception as le:
-            logging.info(f"LLM enhancement failed, using base content: {le}")
-            content = base_content
-        content_with_links = (
-            content
-            + "\n\n[View on Map (embed)](" + view_link + ")"
-            + "\nRaw link: " + view_link
-        )
-        return ChatResponse(model="maps+llm", content=content_with_links)
+        reply = await _places_reply(req, enrich=True)
+        return await _complete_reply(reply, _enrich_budget(req.llm_budget))
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat places error: {e}")
+
+@router.post("/stream", dependencies=[Depends(get_rate_limiter)])
+async def chat_stream(req: ChatRequest):
+    """Streaming variant of POST /chat (Server-Sent Events: `token`..., `done`)."""
+    session_id = await _session(req)
+    async def events():
+        async for chunk in stream_with_ollama(req.prompt, model=req.model, use_cache=req.cache, session_id=session_id):
+            yield _sse("token", {"content": chunk})
+        yield _sse("done", {"model": req.model or "ollama", "session_id": session_id})
+    return _sse_response(events())
+
+@router.post("/directions/stream", dependencies=[Depends(get_rate_limiter)])
+async def chat_directions_stream(req: DirectionsRequest):
+    """Streaming variant of POST /chat/directions: route block first, then AI tokens."""
+    try:
+        # Maps lookup happens before the response starts so errors still map to a 500
+        reply = await _directions_reply(req)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat directions error: {e}")
+    return _sse_response(_stream_reply(reply, req.model))
+
+@router.post("/places/stream", dependencies=[Depends(get_rate_limiter)])
+async def chat_places_stream(req: PlacesRequest):
+    """Streaming variant of POST /chat/places: places block first, then AI tokens."""
+    try:
+        reply = await _places_reply(req)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat places error: {e}")
+    return _sse_response(_stream_reply(reply, req.model))
@@ -1,35 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+import html
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from typing import AsyncIterator, List
 from urllib.parse import quote_plus
-from models.schemas import (DirectionsRequest, DirectionsResult, PlacesRequest, PlacesResult)
-from services.maps_service import directions, text_search_places, build_gmaps_directions_url, normalize_mode
-from deps import get_rate_limiter
+from models.schemas import (DirectionsRequest, DirectionsResult, PlacesRequest, PlacesResult, PlacesPage, PlaceItem,
+                            DirectionsBatchRequest, DirectionsBatchResult,
+                            AutocompleteResult, AutocompleteSuggestion)
+from services.maps_service import directions, text_search_places, places_pages, enrich_places, build_gmaps_directions_url, normalize_mode, batch_travel_times, route_geometry, route_totals
+from services.gazetteer import gazetteer
+from deps import deadline_exceeded, get_rate_limiter, upstream_unavailable
+from utils.deadline import DeadlineExceeded
+from utils.resilience import CircuitOpenError
 from config import get_settings
+from utils.serialization import render
+from utils.static import PageCache, load_template
 router = APIRouter(tags=["maps"])
+_settings = get_settings()
 
 @router.post("/directions", response_model=DirectionsResult, dependencies=[Depends(get_rate_limiter)])
-async def get_directions(req: DirectionsRequest):
+async def get_directions(req: DirectionsRequest, request: Request):
     try:
-        poly_legs = await directions(req.origin, req.destination, req.mode)
-        url = build_gmaps_directions_url(req.origin, req.destination, req.mode)
+        poly_legs = await directions(req.origin, req.destination, req.mode, req.waypoints)
+        url = build_gmaps_directions_url(req.origin, req.destination, req.mode, req.waypoints)
         if not poly_legs:
             # fallback: no route found – still return url so user can open Maps
-            return DirectionsResult(overview_polyline=None, legs=[], maps_url=url)
+            return render(request, DirectionsResult(overview_polyline=None, legs=[], maps_url=url))
         poly, legs = poly_legs
-        return DirectionsResult(overview_polyline=poly, legs=legs, maps_url=url)
+        total_m, total_s = route_totals(legs)
+        geometry = route_geometry(poly, req.geometry, req.zoom) if req.geometry else None
+        return render(request, DirectionsResult(
+            overview_polyline=poly,
+            legs=legs,
+            maps_url=url,
+            total_distance_meters=total_m,
+            total_duration_seconds=total_s,
+            geometry=geometry,
+        ))
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Directions error: {e}")
 
+@router.post("/directions/batch", response_model=DirectionsBatchResult, dependencies=[Depends(get_rate_limiter)])
+async def get_directions_batch(req: DirectionsBatchRequest, request: Request):
+    """Travel distance/time for many origin/destination pairs (Distance Matrix), in input order."""
+    settings = get_settings()
+    if len(req.pairs) > settings.MAPS_BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=422, detail=f"Too many pairs (max {settings.MAPS_BATCH_MAX_PAIRS})")
+    try:
+        mode = normalize_mode(req.mode)
+        results, calls = await batch_travel_times([(p.origin, p.destination) for p in req.pairs], mode)
+        return render(request, DirectionsBatchResult(mode=mode, results=results, upstream_calls=calls))
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Directions batch error: {e}")
+
 @router.post("/places", response_model=PlacesResult, dependencies=[Depends(get_rate_limiter)])
-async def search_places(req: PlacesRequest):
+async def search_places(req: PlacesRequest, request: Request):
     try:
-        items = await text_search_places(req.query, req.location, req.radius)
-        return PlacesResult(items=items)
+        items = await text_search_places(req.query, req.location, req.radius, limit=req.limit)
+        if req.details and _settings.PLACE_DETAILS_ENABLED:
+            items = await enrich_places(items)
+        return render(request, PlacesResult(items=items))
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Places error: {e}")
 
+async def _ndjson_pages(first: List[PlaceItem], pages: AsyncIterator[List[PlaceItem]], limit: int) -> AsyncIterator[str]:
+    sent = 0
+    try:
+        page_no, page = 0, first
+        while True:
+            items = page[: limit - sent]
+            sent += len(items)
+            yield PlacesPage(page=page_no, items=items).model_dump_json() + "\n"
+            if sent >= limit:
+                break
+            page = await anext(pages, None)
+            if page is None:
+                break
+            page_no += 1
+        yield json.dumps({"done": True, "total": sent}) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"Places error: {e}", "total": sent}) + "\n"
+    finally:
+        await pages.aclose()
+
+@router.post("/places/stream", dependencies=[Depends(get_rate_limiter)])
+async def search_places_stream(req: PlacesRequest):
+    """
+    NDJSON variant of POST /maps/places that follows next_page_token: one
+    `{"page": n, "items": [...]}` line per page as soon as it lands (the first
+    one right away), then `{"done": true, "total": n}`. `limit` defaults to
+    every result Google has (max 60).
+    """
+    limit = req.limit or _settings.PLACES_MAX_RESULTS
+    pages = places_pages(req.query, req.location, req.radius)
+    try:
+        # First page before the response starts so upstream errors still map to a status code
+        try:
+            first = await anext(pages, [])
+            if req.details and _settings.PLACE_DETAILS_ENABLED:
+                first = await enrich_places(first)
+        except BaseException:
+            # No response will consume the generator: release it (and its pager subscription) now
+            await pages.aclose()
+            raise
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Places error: {e}")
+    return StreamingResponse(
+        _ndjson_pages(first, pages, limit),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/autocomplete", response_model=AutocompleteResult)
+async def autocomplete(
+    q: str = Query(..., min_length=1, description="Prefix yang sedang diketik, contoh: 'band'"),
+    limit: int = Query(8, ge=1, description="Jumlah saran maksimum"),
+):
+    """
+    Place-name suggestions from the local gazetteer (no Google call). Not rate
+    limited: it is hit per keystroke and costs microseconds.
+    """
+    limit = min(limit, _settings.AUTOCOMPLETE_MAX_LIMIT)
+    entries = gazetteer.suggest(q, limit)
+    return AutocompleteResult(
+        query=q,
+        suggestions=[AutocompleteSuggestion(name=e.name, kind=e.kind) for e in entries],
+    )
+
+def _view_key(*parts) -> str:
+    return "|".join(" ".join(str(p).split()) if p is not None else "" for p in parts)
+
+
+def _render_map_view(title: str, src: str, message: dict) -> str:
+    return load_template("map_view.html").substitute(
+        title=html.escape(title),
+        src=html.escape(src, quote=True),
+        # JSON inside <script>: escape "</" so user text can't close the tag
+        message=json.dumps(message).replace("</", "<\\/"),
+    )
+
+
+def _missing_key_response(request: Request) -> Response:
+    asset = _view_pages.get_or_render("missing-key", lambda: load_template("missing_key.html").template)
+    return asset.respond(request, cache_control="no-cache")
+
+
+_view_pages = PageCache("map_views", _settings.VIEW_CACHE_SIZE, _settings.VIEW_CACHE_TTL)
+
+
 @router.get("/directions/view", response_class=HTMLResponse, dependencies=[Depends(get_rate_limiter)])
 async def directions_view(
+    request: Request,
     origin: str = Query(..., description="Origin address or coordinates"),
     destination: str = Query(..., description="Destination address or coordinates"),
     mode: str = Query("driving", description="driving|walking|bicycling|transit"),
@@ -38,131 +175,76 @@ async def directions_view(
         None,
         description="Optional avoid settings for driving only: 'tolls', 'highways', or 'ferries'"
     ),
+    waypoints: str | None = Query(None, description="Optional stops, separated by '|'"),
 ):
-    """Tampilkan peta rute dalam iframe (Google Maps Embed API)."""
+    """Tampilkan peta rute dalam iframe (Google Maps Embed API). Dirender sekali per parameter."""
     settings = get_settings()
     if not settings.GOOGLE_MAPS_API_KEY:
-        return HTMLResponse(
-            content="""
-            <html><body>
-              <p>GOOGLE_MAPS_API_KEY belum di-set. Tambahkan ke .env untuk menampilkan peta ter-embed.</p>
-            </body></html>
-            """,
-            status_code=200,
-        )
+        return _missing_key_response(request)
     mode = normalize_mode(mode)
-    # Enhanced parameters for better auto-focus (directions-specific)
-    params = {
-        "key": settings.GOOGLE_MAPS_API_KEY,
-        "origin": origin,
-        "destination": destination,
-        "mode": mode,
-        "zoom": str(zoom),
-        "region": "ID",  # Indonesia region for better local results
-        "language": "en",  # English language
-        "units": "metric"  # Use metric units (supported in directions)
-    }
-
-    # Respect optional avoid preference (do not set by default to allow toll roads)
-    if mode == "driving" and avoid:
-        params["avoid"] = avoid
-
-    # Build URL with proper encoding
-    src_params = "&".join([f"{k}={quote_plus(str(v))}" for k, v in params.items() if v])
-    src = f"https://www.google.com/maps/embed/v1/directions?{src_params}"
-    return HTMLResponse(
-        content=f"""
-        <html>
-        <head>
-          <meta name="viewport" content="width=device-width, initial-scale=1">
-          <title>Route: {origin} → {destination}</title>
-        </head>
-        <body style="margin:0;padding:0;background:#000;">
-          <iframe width="100%" height="100%" 
-                  style="border:0; position:fixed; inset:0; background:#000;"
-                  loading="eager" 
-                  allowfullscreen
-                  referrerpolicy="no-referrer-when-downgrade"
-                  src="{src}"></iframe>
-          <script>
-            window.addEventListener('load', function() {{
-              if (window.parent !== window) {{
-                window.parent.postMessage({{
-                  type: 'directions-loaded',
-                  origin: '{origin}',
-                  destination: '{destination}',
-                  mode: '{mode}'
-                }}, '*');
-              }}
-            }});
-          </script>
-        </body>
-        </html>
-        """,
-        status_code=200,
-    )
+    origin, destination = origin.strip(), destination.strip()
+    if waypoints:
+        waypoints = "|".join(w.strip() for w in waypoints.split("|") if w.strip())
+    # avoid only applies to driving (do not set by default to allow toll roads)
+    avoid = avoid.strip().lower() if mode == "driving" and avoid else None
+
+    def render() -> str:
+        # Enhanced parameters for better auto-focus (directions-specific)
+        params = {
+            "key": settings.GOOGLE_MAPS_API_KEY,
+            "origin": origin,
+            "destination": destination,
+            "mode": mode,
+            "zoom": str(zoom),
+            "region": "ID",  # Indonesia region for better local results
+            "language": "en",  # English language
+            "units": "metric",  # Use metric units (supported in directions)
+            "waypoints": waypoints,
+            "avoid": avoid,
+        }
+        # Build URL with proper encoding
+        src_params = "&".join([f"{k}={quote_plus(str(v))}" for k, v in params.items() if v])
+        src = f"https://www.google.com/maps/embed/v1/directions?{src_params}"
+        message = {"type": "directions-loaded", "origin": origin, "destination": destination, "mode": mode}
+        return _render_map_view(f"Route: {origin} → {destination}", src, message)
+
+    key = _view_key("directions", origin, destination, mode, zoom, avoid, waypoints)
+    asset = _view_pages.get_or_render(key, render)
+    return asset.respond(request, cache_control=f"public, max-age={settings.VIEW_MAX_AGE}")
 
 @router.get("/places/view", response_class=HTMLResponse, dependencies=[Depends(get_rate_limiter)])
 async def places_view(
+    request: Request,
     q: str = Query(..., description="Kata kunci pencarian"),
     location: str | None = Query(None, description="lat,lng (opsional untuk pusat peta)"),
     zoom: int = Query(14, ge=3, le=20),  # Higher zoom for places to show more detail
 ):
-    """Display place search results in iframe (Google Maps Embed API)."""
+    """Display place search results in iframe (Google Maps Embed API), rendered once per parameter set."""
     settings = get_settings()
     if not settings.GOOGLE_MAPS_API_KEY:
-        return HTMLResponse(
-            content="""
-            <html><body>
-              <p>GOOGLE_MAPS_API_KEY belum di-set. Tambahkan ke .env untuk menampilkan peta ter-embed.</p>
-            </body></html>
-            """,
-            status_code=200,
-        )
-    # Enhanced parameters for better search focus (places-specific)
-    params = {
-        "key": settings.GOOGLE_MAPS_API_KEY,
-        "q": q,
-        "zoom": str(zoom),
-        "region": "ID",  # Indonesia region
-        "language": "en"  # English language  
-        # Note: 'units' parameter not supported in search API
-    }
-    
-    # Add center if provided for more precise search
-    if location:
-        params["center"] = location
-    
-    # Build URL with proper encoding
-    src_params = "&".join([f"{k}={quote_plus(str(v))}" for k, v in params.items()])
-    src = f"https://www.google.com/maps/embed/v1/search?{src_params}"
-    return HTMLResponse(
-        content=f"""
-        <html>
-        <head>
-          <meta name="viewport" content="width=device-width, initial-scale=1">
-          <title>Places: {q}</title>
-        </head>
-        <body style="margin:0;padding:0;background:#000;">
-          <iframe width="100%" height="100%" 
-                  style="border:0; position:fixed; inset:0; background:#000;"
-                  loading="eager" 
-                  allowfullscreen
-                  referrerpolicy="no-referrer-when-downgrade"
-                  src="{src}"></iframe>
-          <script>
-            window.addEventListener('load', function() {{
-              if (window.parent !== window) {{
-                window.parent.postMessage({{
-                  type: 'places-loaded',
-                  query: '{q}',
-                  location: '{location or ""}'
-                }}, '*');
-              }}
-            }});
-          </script>
-        </body>
-        </html>
-        """,
-        status_code=200,
-    )
+        return _missing_key_response(request)
+    q = q.strip()
+    location = location.replace(" ", "") if location else None
+
+    def render() -> str:
+        # Enhanced parameters for better search focus (places-specific)
+        params = {
+            "key": settings.GOOGLE_MAPS_API_KEY,
+            "q": q,
+            "zoom": str(zoom),
+            "region": "ID",  # Indonesia region
+            "language": "en",  # English language
+            # Note: 'units' parameter not supported in search API
+        }
+        # Add center if provided for more precise search
+        if location:
+            params["center"] = location
+        # Build URL with proper encoding
+        src_params = "&".join([f"{k}={quote_plus(str(v))}" for k, v in params.items()])
+        src = f"https://www.google.com/maps/embed/v1/search?{src_params}"
+        message = {"type": "places-loaded", "query": q, "location": location or ""}
+        return _render_map_view(f"Places: {q}", src, message)
+
+    key = _view_key("places", q, location, zoom)
+    asset = _view_pages.get_or_render(key, render)
+    return asset.respond(request, cache_control=f"public, max-age={settings.VIEW_MAX_AGE}")
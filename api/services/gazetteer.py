@@ -0,0 +1,210 @@
+"""
+Local place-name index for autocomplete and for canonicalizing route endpoints.
+
+Names come from the bundled data/gazetteer.tsv, operator files listed in
+GAZETTEER_PATH (same TSV format) and names seen in Places Text Search
+results. The index is a sorted array of normalized keys (full names and
+aliases, plus every later-word suffix so "selatan" finds "Jakarta Selatan")
+with a parallel array of entry ids, so a prefix lookup is a few bisects plus a
+scan of the matching slices.
+"""
+import bisect
+import heapq
+import logging
+import os
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "gazetteer.tsv")
+
+# Short prefixes match large slices; memoize their top results until the index changes
+_MEMO_MAX_PREFIX = 2
+# Matches on the start of the full name rank above matches on a later word
+_FULL_PREFIX_BONUS = 1_000_000
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, strip accents and punctuation noise, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = "".join(ch if ch.isalnum() else " " for ch in text.lower())
+    return " ".join(text.split())
+
+
+class GazetteerEntry:
+    __slots__ = ("name", "kind", "weight")
+
+    def __init__(self, name: str, kind: str, weight: float) -> None:
+        self.name = name
+        self.kind = kind
+        self.weight = weight
+
+
+class Gazetteer:
+    def __init__(self, max_learned: int = 20_000) -> None:
+        self.entries: List[GazetteerEntry] = []
+        self.max_learned = max_learned
+        self.learned = 0
+        # Sorted normalized keys and the entry id each key points to
+        self._keys: List[str] = []
+        self._ids: List[int] = []
+        # Normalized name or alias -> entry id (exact lookups / canonicalization)
+        self._exact: Dict[str, int] = {}
+        # Top results for short prefixes, cleared whenever the index changes
+        self._memo: Dict[Tuple[str, int], List[int]] = {}
+        self._loaded = False
+        self.lookups = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _index(self, key: str, entry_id: int, full: bool) -> None:
+        # Full names/aliases are stored with a leading "\0" so they sort into their own
+        # block and rank above later-word matches
+        k = "\0" + key if full else key
+        i = bisect.bisect_left(self._keys, k)
+        self._keys.insert(i, k)
+        self._ids.insert(i, entry_id)
+
+    def add(self, name: str, kind: str = "place", weight: float = 1.0, aliases: Iterable[str] = ()) -> int:
+        """Add a name (or bump the weight of an existing one). Returns the entry id."""
+        norm = normalize_name(name)
+        if not norm:
+            return -1
+        existing = self._exact.get(norm)
+        if existing is not None:
+            entry = self.entries[existing]
+            entry.weight = max(entry.weight, weight)
+            self._memo.clear()
+            return existing
+        entry_id = len(self.entries)
+        self.entries.append(GazetteerEntry(name.strip(), kind, weight))
+        for key in (norm, *(normalize_name(a) for a in aliases)):
+            if not key:
+                continue
+            self._exact.setdefault(key, entry_id)
+            self._index(key, entry_id, full=True)
+            words = key.split(" ")
+            for i in range(1, len(words)):
+                self._index(" ".join(words[i:]), entry_id, full=False)
+        self._memo.clear()
+        return entry_id
+
+    def load_tsv(self, path: str) -> int:
+        """name<TAB>kind<TAB>weight<TAB>alias|alias ; '#' starts a comment line."""
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                name = cols[0]
+                kind = cols[1] if len(cols) > 1 and cols[1] else "place"
+                try:
+                    weight = float(cols[2]) if len(cols) > 2 and cols[2] else 1.0
+                except ValueError:
+                    weight = 1.0
+                aliases = [a for a in cols[3].split("|") if a] if len(cols) > 3 else []
+                if self.add(name, kind, weight, aliases) >= 0:
+                    count += 1
+        return count
+
+    def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        settings = get_settings()
+        paths = [BUNDLED_PATH] + [p.strip() for p in settings.GAZETTEER_PATH.split(",") if p.strip()]
+        started = time.perf_counter()
+        for path in paths:
+            try:
+                n = self.load_tsv(path)
+            except OSError as e:
+                logger.warning("Gazetteer file %s not loaded: %s", path, e)
+                continue
+            logger.info("Gazetteer: %s names from %s", n, path)
+        logger.info("Gazetteer ready: %s entries, %s keys (%.1f ms)",
+                    len(self.entries), len(self._keys), (time.perf_counter() - started) * 1000)
+
+    def learn(self, names: Iterable[str]) -> None:
+        """Grow the index from names seen in Places results (bounded by max_learned)."""
+        for name in names:
+            norm = normalize_name(name)
+            if not norm:
+                continue
+            existing = self._exact.get(norm)
+            if existing is not None:
+                # Seen again: nudge it up among learned places
+                entry = self.entries[existing]
+                if entry.kind == "place":
+                    entry.weight += 1
+                    self._memo.clear()
+                continue
+            if self.learned >= self.max_learned:
+                continue
+            self.add(name, "place", 1.0)
+            self.learned += 1
+
+    def _range(self, key: str) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_left(self._keys, key + "\uffff", lo)
+        return lo, hi
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[GazetteerEntry]:
+        """Best entries whose name, alias or any later word starts with `prefix`."""
+        self.ensure_loaded()
+        self.lookups += 1
+        key = normalize_name(prefix)
+        if not key or limit <= 0:
+            return []
+        memo_key = (key, limit)
+        if len(key) <= _MEMO_MAX_PREFIX and memo_key in self._memo:
+            return [self.entries[i] for i in self._memo[memo_key]]
+
+        scores: Dict[int, float] = {}
+        lo, hi = self._range("\0" + key)
+        for i in range(lo, hi):
+            eid = self._ids[i]
+            scores[eid] = self.entries[eid].weight + _FULL_PREFIX_BONUS
+        lo, hi = self._range(key)
+        for i in range(lo, hi):
+            eid = self._ids[i]
+            if eid not in scores:
+                scores[eid] = self.entries[eid].weight
+        best = heapq.nlargest(limit, scores, key=lambda eid: (scores[eid], -len(self.entries[eid].name)))
+        if len(key) <= _MEMO_MAX_PREFIX:
+            self._memo[memo_key] = best
+        return [self.entries[i] for i in best]
+
+    def canonical(self, text: str) -> Optional[str]:
+        """Canonical display name for an exact name/alias match ('bsd' -> 'BSD City'), else None."""
+        self.ensure_loaded()
+        entry_id = self._exact.get(normalize_name(text))
+        return self.entries[entry_id].name if entry_id is not None else None
+
+    def canonical_key(self, text: str) -> str:
+        """
+        Cache-key form of a route endpoint: known names/aliases fold onto one
+        spelling; anything else is only lowercased and whitespace-collapsed
+        (punctuation kept, so '-6.2,106.8' stays distinct from '6.2,106.8').
+        """
+        canonical = self.canonical(text)
+        if canonical is not None:
+            return normalize_name(canonical)
+        return " ".join((text or "").lower().split())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "keys": len(self._keys),
+            "learned": self.learned,
+            "lookups": self.lookups,
+        }
+
+
+gazetteer = Gazetteer(max_learned=get_settings().GAZETTEER_MAX_LEARNED)
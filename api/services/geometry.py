@@ -0,0 +1,161 @@
+"""
+Route geometry helpers: encoded-polyline decode/encode, zoom-aware
+simplification, bounding box and length. All coordinate buffers are NumPy
+arrays of shape (N, 2) holding (lat, lng) in degrees.
+"""
+from typing import Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000.0
+# Web Mercator ground resolution at zoom 0 on the equator (metres per pixel)
+_METERS_PER_PIXEL_Z0 = 156_543.03392
+# Degrees -> metres for the local equirectangular projection used by simplify()
+_M_PER_DEG_LAT = 110_540.0
+_M_PER_DEG_LNG = 111_320.0
+
+# Max 5-bit chunks per value: |delta| < 2^34 E5 units covers any lat/lng
+_MAX_CHUNKS = 7
+
+
+def decode_polyline(encoded: str) -> np.ndarray:
+    """Decode a Google encoded polyline into an (N, 2) float64 array, fully vectorized."""
+    if not encoded:
+        return np.empty((0, 2), dtype=np.float64)
+    b = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    ends = (b & 0x20) == 0
+    if not ends.any():
+        return np.empty((0, 2), dtype=np.float64)
+    # Drop a trailing unterminated chunk (malformed input)
+    b = b[: np.flatnonzero(ends)[-1] + 1]
+    ends = ends[: len(b)]
+
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    group = np.cumsum(np.concatenate(([0], ends[:-1].astype(np.int64))))
+    shift = 5 * (np.arange(len(b)) - starts[group])
+    values = np.add.reduceat((b & 0x1F) << shift, starts)
+
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    if len(deltas) % 2:
+        deltas = deltas[:-1]
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 1e5
+
+
+def _e5(coords: np.ndarray) -> np.ndarray:
+    return np.round(np.asarray(coords, dtype=np.float64) * 1e5).astype(np.int64)
+
+
+def delta_encode(coords: np.ndarray) -> np.ndarray:
+    """Flat int array [lat0, lng0, dlat1, dlng1, ...] in 1e-5 degree units."""
+    ints = _e5(coords)
+    if len(ints) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.diff(ints, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+
+
+def encode_polyline(coords: np.ndarray) -> str:
+    """Encode (N, 2) coordinates as a Google encoded polyline (vectorized)."""
+    deltas = delta_encode(coords)
+    if len(deltas) == 0:
+        return ""
+    v = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    chunks = (v[:, None] >> (5 * np.arange(_MAX_CHUNKS))) & 0x1F
+    # Number of 5-bit chunks needed per value (at least one)
+    remaining = v[:, None] >> (5 * np.arange(1, _MAX_CHUNKS + 1))
+    n_chunks = 1 + (remaining > 0).sum(axis=1)
+    idx = np.arange(_MAX_CHUNKS)
+    keep = idx < n_chunks[:, None]
+    cont = idx < (n_chunks - 1)[:, None]
+    out = (chunks | np.where(cont, 0x20, 0)) + 63
+    return out[keep].astype(np.uint8).tobytes().decode("ascii")
+
+
+def bounding_box(coords: np.ndarray) -> Tuple[float, float, float, float]:
+    """(south, west, north, east)."""
+    if len(coords) == 0:
+        return (0.0, 0.0, 0.0, 0.0)
+    lo = coords.min(axis=0)
+    hi = coords.max(axis=0)
+    return (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+
+
+def path_length_m(coords: np.ndarray) -> float:
+    """Great-circle length of the path in metres (haversine per segment)."""
+    if len(coords) < 2:
+        return 0.0
+    rad = np.radians(coords)
+    lat1, lng1 = rad[:-1, 0], rad[:-1, 1]
+    lat2, lng2 = rad[1:, 0], rad[1:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return float(2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1))).sum())
+
+
+def distances_m(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distance (metres) from one point to many (vectorized haversine)."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def tolerance_for_zoom(zoom: int, lat: float = 0.0, pixels: float = 1.0) -> float:
+    """Ground distance (metres) covered by `pixels` screen pixels at `zoom` and latitude."""
+    return pixels * _METERS_PER_PIXEL_Z0 * np.cos(np.radians(lat)) / (2 ** zoom)
+
+
+def simplify(coords: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas-Peucker simplification with a metric tolerance.
+
+    Level-synchronous: every pending segment is split in the same vectorized
+    pass (point-to-segment distances for all of them at once), so the Python
+    loop runs once per recursion depth rather than once per segment.
+    """
+    n = len(coords)
+    if n < 3 or tolerance_m <= 0:
+        return coords
+    lat0 = np.radians(coords[:, 0].mean())
+    xy = np.empty_like(coords)
+    xy[:, 0] = coords[:, 1] * _M_PER_DEG_LNG * np.cos(lat0)
+    xy[:, 1] = coords[:, 0] * _M_PER_DEG_LAT
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    tol2 = tolerance_m * tolerance_m
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    while len(starts):
+        lens = ends - starts - 1
+        open_ = lens > 0
+        starts, ends, lens = starts[open_], ends[open_], lens[open_]
+        if not len(starts):
+            break
+        # Interior point indices of every segment, laid out segment by segment
+        seg_id = np.repeat(np.arange(len(starts)), lens)
+        offsets = np.cumsum(lens) - lens
+        idx = starts[seg_id] + 1 + (np.arange(lens.sum()) - offsets[seg_id])
+
+        a = xy[starts][seg_id]
+        seg = xy[ends][seg_id] - a
+        pts = xy[idx] - a
+        seg_len2 = (seg * seg).sum(axis=1)
+        t = np.clip((pts * seg).sum(axis=1) / np.where(seg_len2 > 0, seg_len2, 1.0), 0.0, 1.0)
+        diff = pts - t[:, None] * seg
+        d2 = (diff * diff).sum(axis=1)
+
+        seg_max = np.maximum.reduceat(d2, offsets)
+        # First arg-max per segment (seg_id is sorted, so unique() gives one hit each)
+        hits = np.flatnonzero(d2 == seg_max[seg_id])
+        first = hits[np.unique(seg_id[hits], return_index=True)[1]]
+        split = seg_max > tol2
+        mids = idx[first][split]
+        keep[mids] = True
+        starts, ends = np.concatenate((starts[split], mids)), np.concatenate((mids, ends[split]))
+    return coords[keep]
+
+
+def simplify_for_zoom(coords: np.ndarray, zoom: int, pixels: float = 1.0) -> np.ndarray:
+    """Drop vertices that would land within `pixels` of the simplified line at `zoom`."""
+    if len(coords) < 3:
+        return coords
+    return simplify(coords, tolerance_for_zoom(zoom, float(coords[:, 0].mean()), pixels))
@@ -0,0 +1,125 @@
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+GOOGLE = "google"
+OLLAMA = "ollama"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def request_timeout(seconds: float) -> httpx.Timeout:
+    """Per-call timeout that keeps the connect limit (a bare float would replace it)."""
+    return httpx.Timeout(seconds, connect=min(seconds, get_settings().HTTP_CONNECT_TIMEOUT))
+
+
+class ClientRegistry:
+    """
+    Satu httpx.AsyncClient (dengan connection pool sendiri) per upstream.
+
+    Client dibuat sekali saat startup (lihat lifespan di main.py) dan dipakai
+    ulang oleh semua request, sehingga koneksi TCP/TLS ke Google dan Ollama
+    tetap hidup (keep-alive) dan tidak di-handshake ulang per request.
+    """
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self._http2: Dict[str, bool] = {}
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        settings = get_settings()
+        if name == GOOGLE:
+            limits = httpx.Limits(
+                max_connections=settings.GOOGLE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GOOGLE_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            )
+            http2 = settings.GOOGLE_HTTP2 and _http2_available()
+            if settings.GOOGLE_HTTP2 and not http2:
+                logger.warning("GOOGLE_HTTP2 enabled but 'h2' is not installed; using HTTP/1.1.")
+            timeout = httpx.Timeout(30, connect=settings.HTTP_CONNECT_TIMEOUT)
+        elif name == OLLAMA:
+            limits = httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            )
+            # Ollama is plain HTTP on the private network; HTTP/2 buys nothing here
+            http2 = False
+            timeout = httpx.Timeout(60, connect=settings.HTTP_CONNECT_TIMEOUT)
+        else:
+            raise KeyError(f"Unknown upstream client: {name}")
+
+        self._requests[name] = 0
+        self._http2[name] = http2
+
+        async def _count_request(request: httpx.Request) -> None:
+            self._requests[name] += 1
+
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+            event_hooks={"request": [_count_request]},
+        )
+
+    def init(self) -> None:
+        for name in (GOOGLE, OLLAMA):
+            if name not in self._clients:
+                self._clients[name] = self._build(name)
+        logger.info("Upstream HTTP clients initialized: %s", ", ".join(self._clients))
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        # Lazy fallback: scripts / tests that never run the app lifespan still work
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._build(name)
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for name, client in self._clients.items():
+            out[name] = {
+                "requests": self._requests.get(name, 0),
+                "http2": self._http2.get(name, False),
+                **_pool_stats(client),
+            }
+        return out
+
+
+def _pool_stats(client: httpx.AsyncClient) -> Dict[str, Optional[int]]:
+    # httpx does not expose pool state publicly; peek at the httpcore pool defensively
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    if pool is None:
+        return {"connections": None, "idle": None, "active": None}
+    idle = sum(1 for c in connections if c.is_idle())
+    return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+registry = ClientRegistry()
+
+
+def google_client() -> httpx.AsyncClient:
+    return registry.get(GOOGLE)
+
+
+def ollama_client() -> httpx.AsyncClient:
+    return registry.get(OLLAMA)
@@ -1,8 +1,144 @@
-import httpx
-from typing import List, Optional
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from urllib.parse import urlencode, quote_plus
+from pydantic import TypeAdapter
 from config import get_settings
-from models.schemas import DirectionsLeg, PlaceItem
+from models.schemas import DirectionsLeg, MatrixElement, PlaceItem, RouteGeometry
+from services import geometry as geo
+from services.gazetteer import gazetteer
+from services.place_index import place_index
+from services.http_clients import google_client, request_timeout
+from utils import background, deadline
+from utils.cache import MISSING, TieredCache
+from utils.deadline import DeadlineExceeded
+from utils.geo import geohash_encode, geohash_precision_for_radius, parse_latlng
+from utils.metrics import track_upstream
+from utils.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, TransientUpstreamError, call_with_retry, hedge
+from utils.singleflight import SingleFlight
+
+_settings = get_settings()
+directions_cache = TieredCache(
+    "directions",
+    maxsize=_settings.DIRECTIONS_CACHE_SIZE,
+    ttl=_settings.DIRECTIONS_CACHE_TTL,
+    redis_ttl=_settings.DIRECTIONS_CACHE_REDIS_TTL,
+    enabled=_settings.CACHE_ENABLED,
+    stale_ttl=_settings.DIRECTIONS_CACHE_STALE_TTL,
+)
+matrix_cache = TieredCache(
+    "matrix",
+    maxsize=_settings.MATRIX_CACHE_SIZE,
+    ttl=_settings.MATRIX_CACHE_TTL,
+    redis_ttl=_settings.MATRIX_CACHE_REDIS_TTL,
+    enabled=_settings.CACHE_ENABLED,
+)
+places_cache = TieredCache(
+    "places",
+    maxsize=_settings.PLACES_CACHE_SIZE,
+    ttl=_settings.PLACES_CACHE_TTL,
+    redis_ttl=_settings.PLACES_CACHE_REDIS_TTL,
+    enabled=_settings.CACHE_ENABLED,
+    stale_ttl=_settings.PLACES_CACHE_STALE_TTL,
+)
+# Complete paged result sets (up to PLACES_MAX_RESULTS), same key as places_cache
+places_all_cache = TieredCache(
+    "places_all",
+    maxsize=_settings.PLACES_ALL_CACHE_SIZE,
+    ttl=_settings.PLACES_CACHE_TTL,
+    redis_ttl=_settings.PLACES_CACHE_REDIS_TTL,
+    enabled=_settings.CACHE_ENABLED,
+    stale_ttl=_settings.PLACES_CACHE_STALE_TTL,
+)
+# Place Details per place_id (ratings, opening hours): changes rarely, long TTLs
+details_cache = TieredCache(
+    "place_details",
+    maxsize=_settings.PLACE_DETAILS_CACHE_SIZE,
+    ttl=_settings.PLACE_DETAILS_CACHE_TTL,
+    redis_ttl=_settings.PLACE_DETAILS_CACHE_REDIS_TTL,
+    enabled=_settings.CACHE_ENABLED,
+    stale_ttl=_settings.PLACE_DETAILS_CACHE_STALE_TTL,
+)
+# Cached rows are (de)serialized as whole lists in one pydantic-core call each
+_legs = TypeAdapter(List[DirectionsLeg])
+_places = TypeAdapter(List[PlaceItem])
+# Concurrent identical lookups (same cache key) share one upstream call
+_directions_flight = SingleFlight("directions")
+_places_flight = SingleFlight("places")
+_details_flight = SingleFlight("place_details")
+# One breaker per Google endpoint: a failing Places API doesn't block Directions
+_breakers = {
+    endpoint: CircuitBreaker(
+        f"google_{endpoint}",
+        error_rate=_settings.GOOGLE_BREAKER_ERROR_RATE,
+        min_calls=_settings.GOOGLE_BREAKER_MIN_CALLS,
+        window=_settings.GOOGLE_BREAKER_WINDOW,
+        open_seconds=_settings.GOOGLE_BREAKER_OPEN_SECONDS,
+    )
+    for endpoint in ("directions", "distancematrix", "place_textsearch", "place_details")
+}
+# Recent latencies per endpoint: the p95 is the hedging threshold
+_latency = {
+    endpoint: LatencyTracker(
+        f"google_{endpoint}",
+        quantile=_settings.GOOGLE_HEDGE_QUANTILE,
+        min_samples=_settings.GOOGLE_HEDGE_MIN_SAMPLES,
+        max_ratio=_settings.GOOGLE_HEDGE_MAX_RATIO,
+    )
+    for endpoint in _breakers
+}
+
+
+async def _google_get(endpoint: str, url: str, params: dict) -> dict:
+    """
+    GET a Google Maps web service through its circuit breaker, retrying
+    transient failures (network, 429/5xx, status UNKNOWN_ERROR or
+    OVER_QUERY_LIMIT - Google's rate-limit signal, like a 429) with jitter.
+    Timeouts and retries are bounded by the request deadline; with
+    GOOGLE_HEDGE_ENABLED an attempt slower than the recent p95 is hedged.
+    """
+    async def request(timeout: float) -> dict:
+        async with track_upstream("google", endpoint) as call:
+            r = await google_client().get(url, params=params, timeout=request_timeout(timeout))
+            call.status = str(r.status_code)
+            r.raise_for_status()
+        data = r.json()
+        if data.get("status") in ("UNKNOWN_ERROR", "OVER_QUERY_LIMIT"):
+            raise TransientUpstreamError(f"Google {endpoint}: {data['status']}")
+        return data
+
+    async def attempt(timeout: float) -> dict:
+        if not _settings.GOOGLE_HEDGE_ENABLED:
+            return await request(timeout)
+        return await hedge(lambda: request(timeout), _latency[endpoint], ("google", endpoint))
+
+    return await call_with_retry(
+        attempt,
+        _breakers[endpoint],
+        retries=_settings.GOOGLE_RETRIES,
+        base_delay=_settings.GOOGLE_RETRY_BASE_DELAY,
+        max_delay=_settings.GOOGLE_RETRY_MAX_DELAY,
+        label=("google", endpoint),
+        timeout=_settings.GOOGLE_TIMEOUT,
+    )
+
+
+def _check_status(data: dict, what: str, ok=("OK", "ZERO_RESULTS")) -> str:
+    """Google's body status; anything outside `ok` (REQUEST_DENIED, INVALID_REQUEST...) raises."""
+    status = data.get("status", "OK")
+    if status not in ok:
+        raise RuntimeError(f"{what} status {status}: {data.get('error_message', '')}")
+    return status
+
+
+def _revalidate(flight: SingleFlight, key: str, load) -> None:
+    # Joins an in-flight refresh for the same key instead of starting a second one
+    background.spawn(flight.do(key, load), name=f"revalidate:{flight.name}")
 
 
 ALLOWED_MODES = {"driving", "walking", "bicycling", "transit"}
@@ -33,14 +169,73 @@ def normalize_mode(mode: Optional[str]) -> str:
     return m if m in ALLOWED_MODES else "driving"
 
 
-def build_gmaps_directions_url(origin: str, destination: str, mode: str) -> str:
+def build_gmaps_directions_url(origin: str, destination: str, mode: str, waypoints: Optional[List[str]] = None) -> str:
     # URL share (tanpa API Key) – memudahkan user buka langsung di Google Maps
     base = "https://www.google.com/maps/dir/?api=1"
     mode = normalize_mode(mode)
-    q = urlencode({"origin": origin, "destination": destination, "travelmode": mode})
+    params = {"origin": origin, "destination": destination, "travelmode": mode}
+    if waypoints:
+        params["waypoints"] = "|".join(waypoints)
+    q = urlencode(params)
     return f"{base}&{q}"
 
-async def directions(origin: str, destination: str, mode: str):
+def normalize_place_text(text: str) -> str:
+    """Lowercase + collapse whitespace so 'Jakarta ' and 'jakarta' share a cache key."""
+    return " ".join((text or "").lower().split())
+
+
+def directions_cache_key(origin: str, destination: str, mode: str, waypoints: Optional[List[str]] = None) -> str:
+    # Known names/aliases share a key ('BSD', 'bsd city' -> 'bsd city'; see gazetteer)
+    stops = ">".join(gazetteer.canonical_key(w) for w in waypoints or [])
+    # v2: legs carry numeric distance_meters / duration_seconds
+    raw = f"v2|{gazetteer.canonical_key(origin)}|{stops}|{gazetteer.canonical_key(destination)}|{normalize_mode(mode)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def route_totals(legs: List[DirectionsLeg]) -> Tuple[int, int]:
+    """Total (metres, seconds) over all legs, from the numeric Directions values."""
+    return sum(leg.distance_meters for leg in legs), sum(leg.duration_seconds for leg in legs)
+
+
+def format_duration(seconds: int) -> str:
+    """Readable duration, e.g. '2 hours 46 min' (locale-independent)."""
+    total_minutes = round(seconds / 60)
+    if total_minutes < 60:
+        return f"{total_minutes} min"
+    hours, minutes = divmod(total_minutes, 60)
+    if minutes == 0:
+        return f"{hours} hour{'s' if hours > 1 else ''}"
+    return f"{hours} hour{'s' if hours > 1 else ''} {minutes} min"
+
+
+async def directions(origin: str, destination: str, mode: str, waypoints: Optional[List[str]] = None):
+    """
+    Directions dengan cache dua tingkat (LRU in-process + Redis).
+    Hanya rute yang ditemukan yang di-cache; "no route" selalu dicek ulang.
+    `waypoints` (opsional) = titik singgah berurutan; tiap segmen jadi satu leg.
+    """
+    key = directions_cache_key(origin, destination, mode, waypoints)
+    cached = await directions_cache.get(key)
+    if cached is not MISSING:
+        return cached["poly"], _legs.validate_python(cached["legs"])
+
+    async def load():
+        result = await _fetch_directions(origin, destination, mode, waypoints)
+        if result:
+            poly, legs = result
+            await directions_cache.set(key, {"poly": poly, "legs": _legs.dump_python(legs)})
+        return result
+
+    # Expired but within the stale window: answer now, refresh in the background
+    stale = directions_cache.get_stale(key)
+    if stale is not MISSING:
+        _revalidate(_directions_flight, key, load)
+        return stale["poly"], _legs.validate_python(stale["legs"])
+
+    return await _directions_flight.do(key, load)
+
+
+async def _fetch_directions(origin: str, destination: str, mode: str, waypoints: Optional[List[str]] = None):
     """
     Panggil Directions API untuk ambil polyline & ringkasan legs.
     """
@@ -52,12 +247,11 @@ async def directions(origin: str, destination: str, mode: str):
         "mode": mode,
         "key": settings.GOOGLE_MAPS_API_KEY,
     }
+    if waypoints:
+        params["waypoints"] = "|".join(waypoints)
     url = f"{settings.GOOGLE_MAPS_BASE_URL}/directions/json"
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
+    data = await _google_get("directions", url, params)
 
     routes = data.get("routes", [])
     if not routes:
@@ -73,38 +267,525 @@ async def directions(origin: str, destination: str, mode: str):
             DirectionsLeg(
                 distance_text=leg["distance"]["text"],
                 duration_text=leg["duration"]["text"],
+                distance_meters=leg["distance"].get("value", 0),
+                duration_seconds=leg["duration"].get("value", 0),
                 start_address=leg.get("start_address", ""),
                 end_address=leg.get("end_address", "")
             )
         )
     return poly, legs
 
-async def text_search_places(query: str, location: Optional[str], radius: Optional[int]) -> List[PlaceItem]:
+def route_geometry(polyline: Optional[str], fmt: str, zoom: Optional[int] = None) -> Optional[RouteGeometry]:
     """
-    Gunakan Places Text Search. Jika Anda ingin Nearby Search, cukup ganti endpoint.
+    Decode overview_polyline server-side. `fmt`: full (all points),
+    simplified (Douglas-Peucker at `zoom`), delta (simplified, E5 deltas).
+    """
+    if not polyline:
+        return None
+    coords = geo.decode_polyline(polyline)
+    original = len(coords)
+    zoom = 10 if zoom is None else zoom
+    if fmt in ("simplified", "delta"):
+        coords = geo.simplify_for_zoom(coords, zoom)
+    result = RouteGeometry(
+        format=fmt,
+        zoom=zoom if fmt != "full" else None,
+        point_count=len(coords),
+        original_point_count=original,
+        bbox=list(geo.bounding_box(coords)),
+        length_meters=round(geo.path_length_m(coords), 1),
+    )
+    if fmt == "delta":
+        result.deltas = geo.delta_encode(coords).tolist()
+    else:
+        result.points = coords.tolist()
+        result.polyline = geo.encode_polyline(coords) if fmt == "simplified" else polyline
+    return result
+
+
+# Distance Matrix request limits (per Google docs)
+MATRIX_MAX_ORIGINS = 25
+MATRIX_MAX_DESTINATIONS = 25
+MATRIX_MAX_ELEMENTS = 100
+
+
+async def distance_matrix(origins: List[str], destinations: List[str], mode: str) -> List[List[dict]]:
+    """
+    Satu panggilan Distance Matrix API. Return rows[i][j] = element untuk
+    origins[i] -> destinations[j] (raw dict dari Google).
     """
     settings = get_settings()
-    params = {"query": query, "key": settings.GOOGLE_MAPS_API_KEY}
+    params = {
+        "origins": "|".join(origins),
+        "destinations": "|".join(destinations),
+        "mode": normalize_mode(mode),
+        "key": settings.GOOGLE_MAPS_API_KEY,
+    }
+    url = f"{settings.GOOGLE_MAPS_BASE_URL}/distancematrix/json"
+
+    data = await _google_get("distancematrix", url, params)
+    status = data.get("status", "OK")
+    if status != "OK":
+        raise RuntimeError(f"Distance Matrix status {status}: {data.get('error_message', '')}")
+    return [row.get("elements", []) for row in data.get("rows", [])]
+
+
+def plan_matrix_calls(pairs: List[Tuple[str, str]]) -> List[Tuple[List[str], List[str]]]:
+    """
+    Kelompokkan pasangan (origin, destination) ke sesedikit mungkin panggilan
+    Distance Matrix tanpa membayar element yang tidak diminta: destinations
+    tiap origin dipotong per 25, lalu origin dengan potongan destinations yang
+    identik digabung dalam satu panggilan (<= 25 origins, <= 100 elements).
+    """
+    by_origin: "OrderedDict[str, List[str]]" = OrderedDict()
+    for origin, destination in pairs:
+        dests = by_origin.setdefault(origin, [])
+        if destination not in dests:
+            dests.append(destination)
+
+    by_chunk: "OrderedDict[Tuple[str, ...], List[str]]" = OrderedDict()
+    for origin, dests in by_origin.items():
+        for i in range(0, len(dests), MATRIX_MAX_DESTINATIONS):
+            chunk = tuple(sorted(dests[i:i + MATRIX_MAX_DESTINATIONS]))
+            by_chunk.setdefault(chunk, []).append(origin)
+
+    calls: List[Tuple[List[str], List[str]]] = []
+    for chunk, origins in by_chunk.items():
+        per_call = max(1, min(MATRIX_MAX_ORIGINS, MATRIX_MAX_ELEMENTS // len(chunk)))
+        for i in range(0, len(origins), per_call):
+            calls.append((origins[i:i + per_call], list(chunk)))
+    return calls
+
+
+def _matrix_element(origin: str, destination: str, raw: Optional[dict]) -> MatrixElement:
+    raw = raw or {}
+    distance = raw.get("distance") or {}
+    duration = raw.get("duration") or {}
+    return MatrixElement(
+        origin=origin,
+        destination=destination,
+        status=raw.get("status", "NOT_FOUND"),
+        distance_text=distance.get("text"),
+        duration_text=duration.get("text"),
+        distance_meters=distance.get("value"),
+        duration_seconds=duration.get("value"),
+    )
+
+
+def _chunk_error_status(exc: BaseException) -> str:
+    if isinstance(exc, CircuitOpenError):
+        return "UNAVAILABLE"
+    if isinstance(exc, DeadlineExceeded):
+        return "DEADLINE_EXCEEDED"
+    return "UPSTREAM_ERROR"
+
+
+async def batch_travel_times(pairs: List[Tuple[str, str]], mode: str) -> Tuple[List[MatrixElement], int]:
+    """
+    Travel time untuk banyak pasangan sekaligus. Pasangan yang sudah ada di cache
+    tidak dipanggil ulang; sisanya dikelompokkan (plan_matrix_calls) dan
+    dijalankan dengan jendela konkurensi terbatas. Hasil mengikuti urutan input.
+    Panggilan yang gagal hanya menandai elemennya sendiri (status
+    UPSTREAM_ERROR / UNAVAILABLE / DEADLINE_EXCEEDED); jika semua gagal,
+    error pertama diteruskan. Return (results, jumlah panggilan upstream).
+    """
+    settings = get_settings()
+    mode = normalize_mode(mode)
+
+    # Dedupe on the normalized pair; the first spelling seen is sent upstream
+    keys = [directions_cache_key(o, d, mode) for o, d in pairs]
+    unique: Dict[str, Tuple[str, str]] = {}
+    for key, pair in zip(keys, pairs):
+        unique.setdefault(key, pair)
+
+    resolved: Dict[str, dict] = {}
+    missing: Dict[Tuple[str, str], str] = {}
+    for key, pair in unique.items():
+        cached = await matrix_cache.get(key)
+        if cached is not MISSING:
+            resolved[key] = cached
+        else:
+            missing[pair] = key
+
+    calls = plan_matrix_calls(list(missing))
+    semaphore = asyncio.Semaphore(max(1, settings.MAPS_BATCH_CONCURRENCY))
+
+    async def run(origins: List[str], destinations: List[str]) -> None:
+        try:
+            async with semaphore:
+                rows = await distance_matrix(origins, destinations, mode)
+        except Exception as e:
+            # One bad chunk must not throw away (or fail) the others
+            logging.warning(f"Distance Matrix chunk {len(origins)}x{len(destinations)} failed: {e}")
+            status = _chunk_error_status(e)
+            for origin in origins:
+                for destination in destinations:
+                    key = missing.get((origin, destination))
+                    if key is not None:
+                        resolved[key] = {"status": status}
+            raise
+        for i, origin in enumerate(origins):
+            row = rows[i] if i < len(rows) else []
+            for j, destination in enumerate(destinations):
+                key = missing.get((origin, destination))
+                if key is None:
+                    continue
+                raw = row[j] if j < len(row) else {}
+                resolved[key] = raw
+                if raw.get("status") == "OK":
+                    await matrix_cache.set(key, raw)
+
+    outcomes = await asyncio.gather(*(run(o, d) for o, d in calls), return_exceptions=True)
+    errors = [e for e in outcomes if isinstance(e, BaseException)]
+    if errors and len(errors) == len(calls):
+        raise errors[0]
+
+    results = [_matrix_element(o, d, resolved.get(key)) for key, (o, d) in zip(keys, pairs)]
+    return results, len(calls)
+
+
+def places_cache_key(query: str, location: Optional[str], radius: Optional[int]) -> str:
+    """
+    Query dinormalisasi, lalu `location` di-snap ke sel geohash yang ukurannya
+    relatif terhadap radius, sehingga user yang berjarak beberapa meter
+    (query sama) berbagi entri cache yang sama.
+    """
+    q = normalize_place_text(query)
+    latlng = parse_latlng(location)
+    if latlng:
+        precision = geohash_precision_for_radius(radius or 5000, _settings.PLACES_CACHE_CELL_FRACTION)
+        cell = geohash_encode(latlng[0], latlng[1], precision)
+    else:
+        cell = normalize_place_text(location or "")
+    raw = f"{q}|{cell}|{radius or 0}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+async def text_search_places(
+    query: str, location: Optional[str], radius: Optional[int], limit: Optional[int] = None
+) -> List[PlaceItem]:
+    """
+    Places Text Search dengan cache geo-bucket (lihat places_cache_key).
+    Jika `location` + `radius` berada di dalam area yang baru saja dicari
+    dengan query yang sama, jawaban diambil dari place_index (tanpa Google).
+    Dengan `limit`, halaman berikutnya (next_page_token) ikut diambil sampai
+    `limit` hasil (lihat places_pages).
+    """
+    if limit is not None:
+        return await _collect_pages(query, location, radius, limit)
+
+    key = places_cache_key(query, location, radius)
+    cached = await places_cache.get(key)
+    if cached is not MISSING:
+        return _places.validate_python(cached)
+
+    latlng = parse_latlng(location) if _settings.PLACE_INDEX_ENABLED and radius else None
+    q = normalize_place_text(query)
+    if latlng:
+        local = place_index.search(q, latlng[0], latlng[1], radius)
+        if local is not None:
+            return local
+
+    async def load():
+        items = await _fetch_text_search_places(query, location, radius)
+        await places_cache.set(key, _places.dump_python(items))
+        _remember_places(query, location, radius, items)
+        return items
+
+    stale = places_cache.get_stale(key)
+    if stale is not MISSING:
+        _revalidate(_places_flight, key, load)
+        return _places.validate_python(stale)
+
+    return await _places_flight.do(key, load)
+
+
+def _remember_places(query: str, location: Optional[str], radius: Optional[int], items: List[PlaceItem]) -> None:
+    """Feed fresh Google results to the spatial index and the gazetteer."""
+    latlng = parse_latlng(location) if _settings.PLACE_INDEX_ENABLED and radius else None
+    if latlng:
+        place_index.record(normalize_place_text(query), latlng[0], latlng[1], radius, items)
+    if _settings.GAZETTEER_LEARN:
+        gazetteer.learn(it.name for it in items)
+
+
+def _text_search_params(query: str, location: Optional[str], radius: Optional[int]) -> dict:
+    params = {"query": query, "key": get_settings().GOOGLE_MAPS_API_KEY}
     if location:
         params["location"] = location
     if radius:
         params["radius"] = radius
+    return params
 
-    url = f"{settings.GOOGLE_MAPS_BASE_URL}/place/textsearch/json"
-
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
 
-    results = data.get("results", [])
+def _place_items(results: list) -> List[PlaceItem]:
     items: List[PlaceItem] = []
-    for row in results[:10]:
+    for row in results:
+        loc = (row.get("geometry") or {}).get("location") or {}
         items.append(
             PlaceItem(
                 name=row.get("name", ""),
                 address=row.get("formatted_address"),
                 place_id=row.get("place_id"),
+                lat=loc.get("lat"),
+                lng=loc.get("lng"),
+                # Free with Text Search; opening hours come from Place Details
+                rating=row.get("rating"),
+                user_ratings_total=row.get("user_ratings_total"),
             )
         )
     return items
+
+
+async def _fetch_text_search_places(query: str, location: Optional[str], radius: Optional[int]) -> List[PlaceItem]:
+    """
+    Gunakan Places Text Search. Jika Anda ingin Nearby Search, cukup ganti endpoint.
+    """
+    settings = get_settings()
+    url = f"{settings.GOOGLE_MAPS_BASE_URL}/place/textsearch/json"
+    data = await _google_get("place_textsearch", url, _text_search_params(query, location, radius))
+    # Raises on quota / denied replies so their empty result is never cached
+    _check_status(data, "Places Text Search")
+    return _place_items(data.get("results", [])[:10])
+
+
+# ----- Paged Text Search (next_page_token) -----
+
+class PlacePages:
+    """
+    Pages of one paged Text Search, published as they arrive. Any number of
+    readers can iterate them concurrently, from the first page, while the
+    fetch is still running.
+    """
+
+    def __init__(self) -> None:
+        self.pages: List[List[PlaceItem]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, page: List[PlaceItem]) -> None:
+        self.pages.append(page)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    async def read(self) -> AsyncIterator[List[PlaceItem]]:
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.pages):
+                yield self.pages[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            # A reader never waits past its own request deadline
+            await deadline.bound(changed.wait(), "places paging")
+
+
+# In-flight paged searches by places_cache_key
+_pagers: Dict[str, PlacePages] = {}
+
+
+async def places_pages(query: str, location: Optional[str], radius: Optional[int]) -> AsyncIterator[List[PlaceItem]]:
+    """
+    Semua halaman Text Search (maks PLACES_MAX_RESULTS), di-yield begitu tiba.
+    Hasil lengkap di-cache (places_all); kalau belum ada, ikut pager yang sedang
+    berjalan untuk key yang sama atau mulai satu di background, jadi halaman
+    tetap diambil (dan di-cache) walau pembaca berhenti lebih awal.
+    """
+    key = places_cache_key(query, location, radius)
+    cached = await places_all_cache.get(key)
+    if cached is not MISSING:
+        yield _places.validate_python(cached)
+        return
+    pager = _pagers.get(key)
+    if pager is None:
+        pager = _start_pager(key, query, location, radius)
+        stale = places_all_cache.get_stale(key)
+        if stale is not MISSING:
+            # Refreshing in the background; answer with the previous full set
+            yield _places.validate_python(stale)
+            return
+    async for page in pager.read():
+        yield page
+
+
+async def _collect_pages(query: str, location: Optional[str], radius: Optional[int], limit: int) -> List[PlaceItem]:
+    items: List[PlaceItem] = []
+    try:
+        async with aclosing(places_pages(query, location, radius)) as pages:
+            async for page in pages:
+                items.extend(page)
+                if len(items) >= limit:
+                    break
+    except DeadlineExceeded:
+        # Out of time while later pages were pending: return what arrived
+        if not items:
+            raise
+    return items[:limit]
+
+
+def _start_pager(key: str, query: str, location: Optional[str], radius: Optional[int]) -> PlacePages:
+    pager = PlacePages()
+    _pagers[key] = pager
+    task = background.spawn(_fetch_all_pages(key, query, location, radius, pager), name="places-pager")
+    task.add_done_callback(lambda _t: _pagers.pop(key, None) if _pagers.get(key) is pager else None)
+    return pager
+
+
+async def _next_page(url: str, token: str) -> dict:
+    # A fresh next_page_token is rejected (INVALID_REQUEST) until Google has the page ready
+    params = {"pagetoken": token, "key": get_settings().GOOGLE_MAPS_API_KEY}
+    for _ in range(_settings.PLACES_PAGE_TOKEN_RETRIES + 1):
+        await asyncio.sleep(_settings.PLACES_PAGE_TOKEN_DELAY)
+        data = await _google_get("place_textsearch", url, params)
+        if data.get("status") != "INVALID_REQUEST":
+            break
+    return data
+
+
+async def _fetch_all_pages(
+    key: str, query: str, location: Optional[str], radius: Optional[int], pager: PlacePages
+) -> None:
+    settings = get_settings()
+    url = f"{settings.GOOGLE_MAPS_BASE_URL}/place/textsearch/json"
+    max_results = settings.PLACES_MAX_RESULTS
+    items: List[PlaceItem] = []
+    try:
+        data = await _google_get("place_textsearch", url, _text_search_params(query, location, radius))
+        _check_status(data, "Places Text Search")
+        while True:
+            page = _place_items(data.get("results", [])[: max_results - len(items)])
+            items.extend(page)
+            pager.publish(page)
+            token = data.get("next_page_token")
+            if not token or len(items) >= max_results:
+                break
+            data = await _next_page(url, token)
+            if data.get("status") != "OK":
+                # Token never became valid (INVALID_REQUEST) or the page was refused:
+                # readers keep what arrived, but the set is incomplete - don't cache it
+                pager.finish()
+                return
+    except BaseException as e:
+        pager.finish(e)
+        raise
+    pager.finish()
+    await places_all_cache.set(key, _places.dump_python(items))
+    _remember_places(query, location, radius, items)
+
+
+# ----- Place Details enrichment -----
+
+_DETAILS_FIELDS = "place_id,rating,user_ratings_total,opening_hours,utc_offset"
+_MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+def open_now(periods: Optional[list], utc_offset: Optional[int], now: Optional[float] = None) -> Optional[bool]:
+    """
+    Whether a place is open at `now` from its Place Details `periods` (Google
+    days: 0 = Sunday) and `utc_offset` (minutes). Computed at read time, so the
+    cached hours never serve a stale open/closed flag. None if hours unknown.
+    """
+    if not periods or utc_offset is None:
+        return None
+    local = datetime.fromtimestamp((now if now is not None else time.time()) + utc_offset * 60, tz=timezone.utc)
+    minute = ((local.weekday() + 1) % 7) * 1440 + local.hour * 60 + local.minute
+    for period in periods:
+        start, end = period.get("open"), period.get("close")
+        if start is None:
+            continue
+        if end is None:
+            return True  # open around the clock
+        a = start["day"] * 1440 + int(start["time"][:2]) * 60 + int(start["time"][2:])
+        b = end["day"] * 1440 + int(end["time"][:2]) * 60 + int(end["time"][2:])
+        if b <= a:
+            b += _MINUTES_PER_WEEK  # wraps past Saturday night
+        if a <= minute < b or a <= minute + _MINUTES_PER_WEEK < b:
+            return True
+    return False
+
+
+async def _fetch_place_details(place_id: str) -> dict:
+    settings = get_settings()
+    url = f"{settings.GOOGLE_MAPS_BASE_URL}/place/details/json"
+    params = {"place_id": place_id, "fields": _DETAILS_FIELDS, "key": settings.GOOGLE_MAPS_API_KEY}
+    data = await _google_get("place_details", url, params)
+    # NOT_FOUND / REQUEST_DENIED / INVALID_REQUEST raise: enrich_places keeps the bare item
+    # and nothing is cached (OVER_QUERY_LIMIT is already retried as transient by _google_get)
+    _check_status(data, "Place Details", ok=("OK",))
+    result = data.get("result") or {}
+    hours = result.get("opening_hours") or {}
+    return {
+        "rating": result.get("rating"),
+        "user_ratings_total": result.get("user_ratings_total"),
+        "weekday_text": hours.get("weekday_text"),
+        "periods": hours.get("periods"),
+        "utc_offset": result.get("utc_offset"),
+    }
+
+
+async def place_details(place_id: str) -> dict:
+    """Cached Place Details subset for one place_id (see _fetch_place_details)."""
+    cached = await details_cache.get(place_id)
+    if cached is not MISSING:
+        return cached
+
+    async def load():
+        details = await _fetch_place_details(place_id)
+        await details_cache.set(place_id, details)
+        return details
+
+    stale = details_cache.get_stale(place_id)
+    if stale is not MISSING:
+        _revalidate(_details_flight, place_id, load)
+        return stale
+    return await _details_flight.do(place_id, load)
+
+
+def _with_details(item: PlaceItem, details: dict) -> PlaceItem:
+    return item.model_copy(update={
+        "rating": details.get("rating") if details.get("rating") is not None else item.rating,
+        "user_ratings_total": details.get("user_ratings_total") or item.user_ratings_total,
+        "opening_hours": details.get("weekday_text"),
+        "open_now": open_now(details.get("periods"), details.get("utc_offset")),
+    })
+
+
+async def enrich_places(items: List[PlaceItem], top_n: Optional[int] = None) -> List[PlaceItem]:
+    """
+    Tambah rating & jam buka (Place Details) ke `top_n` item pertama.
+    Semua detail diambil bersamaan (maks PLACE_DETAILS_CONCURRENCY sekaligus),
+    jadi biayanya satu round-trip; yang belum selesai dalam
+    PLACE_DETAILS_BUDGET_SECONDS dilewati (tetap jalan di background dan
+    mengisi cache untuk request berikutnya). Gagal = item apa adanya.
+    """
+    settings = get_settings()
+    top_n = settings.PLACE_DETAILS_TOP_N if top_n is None else top_n
+    targets = {it.place_id for it in items[:top_n] if it.place_id}
+    if not targets:
+        return items
+    semaphore = asyncio.Semaphore(max(1, settings.PLACE_DETAILS_CONCURRENCY))
+
+    async def fetch(place_id: str) -> dict:
+        async with semaphore:
+            return await place_details(place_id)
+
+    tasks = {pid: background.spawn(fetch(pid), name="place-details") for pid in targets}
+    await asyncio.wait(tasks.values(), timeout=deadline.timeout_for(settings.PLACE_DETAILS_BUDGET_SECONDS))
+    details = {
+        pid: task.result()
+        for pid, task in tasks.items()
+        if task.done() and not task.cancelled() and task.exception() is None
+    }
+    return [_with_details(it, details[it.place_id]) if it.place_id in details else it for it in items]
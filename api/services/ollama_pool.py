@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from config import get_settings
+from services.http_clients import ollama_client, request_timeout
+from services.ollama_scheduler import scheduler
+from utils.metrics import track_upstream
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Errors that say "this host is not serving", as opposed to a slow generation
+_BACKEND_DOWN_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+def normalize_model_name(name: str) -> str:
+    """Ollama treats 'llama3.2' as 'llama3.2:latest'."""
+    return name if ":" in name else f"{name}:latest"
+
+
+async def fetch_tags(base_url: str, timeout: float = 30) -> List[Dict[str, Any]]:
+    """GET {base_url}/api/tags -> [{"name": "llama3.2:3b", ...}, ...]"""
+    async with track_upstream("ollama", "tags") as call:
+        r = await ollama_client().get(f"{base_url}/api/tags", timeout=request_timeout(timeout))
+        call.status = str(r.status_code)
+        r.raise_for_status()
+    data = r.json() or {}
+    return data.get("models", [])
+
+
+class OllamaBackend:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.models: Set[str] = set()
+        self.catalogue: List[Dict[str, Any]] = []
+        self.outstanding = 0
+        self.failures = 0
+        self.requests = 0
+        self.last_probe: Optional[float] = None
+
+    def has_model(self, model: str) -> bool:
+        # Unknown catalogue (not probed yet) -> don't exclude the backend
+        return not self.models or normalize_model_name(model) in self.models
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "models": sorted(self.models),
+            "last_probe": self.last_probe,
+        }
+
+
+class OllamaPool:
+    """
+    Several Ollama hosts behind one interface.
+
+    Generations go to the healthy backend with the requested model that has
+    the fewest outstanding requests. A background probe (the same /api/tags
+    call list_models uses) refreshes each backend's model list, evicts hosts
+    after consecutive failures and re-admits them once they answer again.
+    """
+
+    def __init__(self, urls: List[str], evict_after: int, probe_interval: float) -> None:
+        self.backends = [OllamaBackend(u) for u in urls]
+        self.evict_after = max(1, evict_after)
+        self.probe_interval = probe_interval
+        self._rr = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.catalogue_at = 0.0
+        self._refresh = SingleFlight("ollama_tags")
+
+    @property
+    def healthy(self) -> List[OllamaBackend]:
+        return [b for b in self.backends if b.healthy]
+
+    def pick(self, model: str, prefer: Optional[str] = None) -> OllamaBackend:
+        candidates = [b for b in self.healthy if b.has_model(model)] or self.healthy or self.backends
+        for b in candidates:
+            # Affinity (chat sessions): the backend that still holds the conversation's KV cache
+            if b.url == prefer:
+                return b
+        least = min(b.outstanding for b in candidates)
+        tied = [b for b in candidates if b.outstanding == least]
+        return tied[next(self._rr) % len(tied)]
+
+    def record_failure(self, backend: OllamaBackend, reason: Any) -> None:
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.evict_after:
+            backend.healthy = False
+            logger.warning("Ollama backend %s evicted after %s failures: %s", backend.url, backend.failures, reason)
+            self._resize_scheduler()
+
+    def record_success(self, backend: OllamaBackend) -> None:
+        backend.failures = 0
+        if not backend.healthy:
+            backend.healthy = True
+            logger.info("Ollama backend %s re-admitted", backend.url)
+            self._resize_scheduler()
+
+    def _resize_scheduler(self) -> None:
+        # OLLAMA_MAX_CONCURRENCY is per backend; total capacity follows the healthy set
+        per_backend = get_settings().OLLAMA_MAX_CONCURRENCY
+        scheduler.set_capacity(per_backend * max(1, len(self.healthy)))
+
+    @asynccontextmanager
+    async def lease(self, model: str, prefer: Optional[str] = None) -> AsyncIterator[OllamaBackend]:
+        """Route one request: yields the chosen backend and tracks its load/health."""
+        backend = self.pick(model, prefer)
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+        except _BACKEND_DOWN_ERRORS as e:
+            self.record_failure(backend, e)
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                self.record_failure(backend, e)
+            raise
+        else:
+            self.record_success(backend)
+        finally:
+            backend.outstanding -= 1
+
+    async def probe(self, backend: OllamaBackend, timeout: float = 5) -> None:
+        try:
+            catalogue = await fetch_tags(backend.url, timeout=timeout)
+        except Exception as e:
+            backend.last_probe = time.time()
+            self.record_failure(backend, e)
+            return
+        backend.last_probe = time.time()
+        backend.catalogue = catalogue
+        backend.models = {normalize_model_name(m.get("name", "")) for m in catalogue if m.get("name")}
+        self.record_success(backend)
+
+    async def probe_all(self, timeout: float = 5) -> None:
+        await asyncio.gather(*(self.probe(b, timeout) for b in self.backends))
+        self.catalogue_at = time.monotonic()
+
+    async def refresh(self, timeout: float = 5) -> None:
+        """probe_all, coalesced: concurrent callers share one round of /api/tags calls."""
+        await self._refresh.do("all", lambda: self.probe_all(timeout))
+
+    def catalogue_age(self) -> float:
+        return time.monotonic() - self.catalogue_at
+
+    def catalogue(self) -> List[Dict[str, Any]]:
+        """Models available on healthy backends (deduplicated by name)."""
+        seen: Dict[str, Dict[str, Any]] = {}
+        for backend in self.healthy:
+            for m in backend.catalogue:
+                seen.setdefault(m.get("name", ""), m)
+        return list(seen.values())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning("Ollama health probe failed: %s", e)
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self) -> None:
+        self._resize_scheduler()
+        if self._task is None and self.probe_interval > 0:
+            self._task = asyncio.create_task(self._run(), name="ollama-health")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {b.url: b.stats() for b in self.backends}
+
+
+def _backend_urls() -> List[str]:
+    settings = get_settings()
+    urls = [u.strip() for u in settings.OLLAMA_BASE_URLS.split(",") if u.strip()]
+    return urls or [settings.OLLAMA_BASE_URL]
+
+
+_settings = get_settings()
+pool = OllamaPool(_backend_urls(), _settings.OLLAMA_EVICT_AFTER_FAILURES, _settings.OLLAMA_HEALTH_INTERVAL)
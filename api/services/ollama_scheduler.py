@@ -0,0 +1,128 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from config import get_settings
+from utils.metrics import record_ollama_slot
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_ENRICHMENT = 10
+
+_CLASS_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_ENRICHMENT: "enrichment"}
+
+
+class OllamaOverloaded(Exception):
+    """Raised when optional (enrichment) work is shed because the queue is too deep."""
+
+
+class _Timing:
+    __slots__ = ("count", "wait_total", "wait_max", "gen_total", "gen_max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.gen_total = 0.0
+        self.gen_max = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        n = self.count or 1
+        return {
+            "completed": self.count,
+            "wait_avg_s": round(self.wait_total / n, 4),
+            "wait_max_s": round(self.wait_max, 4),
+            "generation_avg_s": round(self.gen_total / n, 4),
+            "generation_max_s": round(self.gen_max, 4),
+        }
+
+
+class OllamaScheduler:
+    """
+    Admission control in front of Ollama: at most `max_concurrency` generations
+    run at once, waiters are served by priority (interactive before enrichment,
+    FIFO within a class), and enrichment is shed outright once the queue is
+    `shed_queue_depth` deep instead of piling up and timing out together.
+    """
+
+    def __init__(self, max_concurrency: int, shed_queue_depth: int) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.shed_queue_depth = shed_queue_depth
+        self._running = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.shed = 0
+        self._timings: Dict[int, _Timing] = {}
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def _grant_next(self) -> None:
+        while self._waiters and self._running < self.max_concurrency:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():  # cancelled while queued
+                continue
+            self._running += 1
+            fut.set_result(None)
+
+    async def _acquire(self, priority: int) -> None:
+        if self._running < self.max_concurrency and not self.queued:
+            self._running += 1
+            return
+        if priority >= PRIORITY_ENRICHMENT and self.queued >= self.shed_queue_depth:
+            self.shed += 1
+            raise OllamaOverloaded(f"Ollama queue depth {self.queued} >= {self.shed_queue_depth}")
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was granted just as we were cancelled: hand it on
+                self._release()
+            raise
+
+    def set_capacity(self, max_concurrency: int) -> None:
+        """Resize the slot pool (e.g. when Ollama backends join or leave)."""
+        self.max_concurrency = max(1, max_concurrency)
+        self._grant_next()
+
+    def _release(self) -> None:
+        self._running -= 1
+        self._grant_next()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """Hold one generation slot for the duration of the block."""
+        queued_at = time.monotonic()
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release()
+            done = time.monotonic()
+            timing = self._timings.setdefault(priority, _Timing())
+            timing.count += 1
+            timing.wait_total += started - queued_at
+            timing.wait_max = max(timing.wait_max, started - queued_at)
+            timing.gen_total += done - started
+            timing.gen_max = max(timing.gen_max, done - started)
+            record_ollama_slot(_CLASS_NAMES.get(priority, str(priority)), started - queued_at, done - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self.queued,
+            "shed": self.shed,
+            "classes": {_CLASS_NAMES.get(p, str(p)): t.as_dict() for p, t in sorted(self._timings.items())},
+        }
+
+
+_settings = get_settings()
+scheduler = OllamaScheduler(_settings.OLLAMA_MAX_CONCURRENCY, _settings.OLLAMA_SHED_QUEUE_DEPTH)
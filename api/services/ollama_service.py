@@ -1,16 +1,120 @@
+import asyncio
+import hashlib
+import json
+import uuid
+import weakref
+from contextlib import asynccontextmanager
 import httpx
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Optional
 import logging
 from config import get_settings
+from services.http_clients import ollama_client, request_timeout
+from services.ollama_scheduler import OllamaOverloaded, PRIORITY_INTERACTIVE, scheduler
+from services.ollama_pool import pool
+from utils import deadline
+from utils.cache import MISSING, TieredCache
+from utils.deadline import DeadlineExceeded
+from utils.metrics import record_ollama_usage, record_retry, track_upstream
+from utils.singleflight import SingleFlight
 
+# Not worth starting (or retrying) a generation with less time than this left
+_MIN_GENERATE_SECONDS = 1.0
 
-async def generate_with_ollama(prompt: str, model: Optional[str] = None, max_retries: int = 2) -> str:
+# Identical concurrent generations (same model + prompt + options) share one Ollama call
+_generate_flight = SingleFlight("ollama_generate")
+
+_settings = get_settings()
+# Memoized generations keyed on model + prompt + options (see generation_key)
+generation_cache = TieredCache(
+    "ollama_generate",
+    maxsize=_settings.OLLAMA_CACHE_SIZE,
+    ttl=_settings.OLLAMA_CACHE_TTL,
+    redis_ttl=_settings.OLLAMA_CACHE_REDIS_TTL,
+    enabled=_settings.CACHE_ENABLED,
+)
+
+# Chat sessions: Ollama's `context` (the conversation so far, as tokens) per
+# session id, so a follow-up turn continues from it instead of re-sending the
+# whole history. Size-bounded LRU with an idle TTL, shared through Redis.
+# Functional state rather than a cache, so CACHE_ENABLED does not turn it off.
+session_store = TieredCache(
+    "chat_sessions",
+    maxsize=_settings.CHAT_SESSION_MAX,
+    ttl=_settings.CHAT_SESSION_TTL,
+    redis_ttl=_settings.CHAT_SESSION_REDIS_TTL,
+)
+# One turn at a time per session (a second one would fork the context)
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class UnknownSession(KeyError):
+    """A session_id the server never issued, or one that has expired."""
+
+
+async def open_session(session_id: Optional[str] = None) -> str:
+    """
+    Validate `session_id`, or mint a new one. Ids are random (uuid4) and only
+    ids issued here are accepted, so a client cannot pick or guess its way
+    into somebody else's conversation.
+    """
+    if session_id is not None:
+        if await session_store.get(session_id) is MISSING:
+            raise UnknownSession(session_id)
+        return session_id
+    session_id = uuid.uuid4().hex
+    await session_store.set(session_id, {"model": None, "backend": None, "turns": 0})
+    return session_id
+
+
+@asynccontextmanager
+async def _session_turn(session_id: str) -> AsyncIterator[None]:
+    """Hold the session's lock for one turn; waiting for it counts against the request deadline."""
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    await deadline.bound(lock.acquire(), "chat session turn")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+async def _load_session(session_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Session state for this turn; `payload` continues the stored context if the model matches."""
+    state = await session_store.get(session_id)
+    if state is MISSING or state.get("model") != payload["model"] or not state.get("context"):
+        return {"model": payload["model"], "backend": None, "turns": 0}
+    payload["context"] = state["context"]
+    return dict(state)
+
+
+async def _save_session(session_id: str, state: Dict[str, Any], data: Dict[str, Any], backend: str) -> None:
+    context = data.get("context")
+    if not context:
+        return
+    if len(context) > get_settings().CHAT_SESSION_MAX_CONTEXT:
+        # Past the model's window Ollama truncates anyway; start over instead of hauling it around
+        await session_store.set(session_id, {"model": state["model"], "backend": backend, "turns": 0})
+        return
+    state.update(context=context, backend=backend, turns=state.get("turns", 0) + 1)
+    await session_store.set(session_id, state)
+
+
+def generation_key(payload: Dict[str, Any]) -> str:
+    # keep_alive only controls model residency, not the answer
+    significant = {k: v for k, v in payload.items() if k != "keep_alive"}
+    raw = json.dumps(significant, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def build_payload(prompt: str, model: Optional[str], stream: bool = False) -> Dict[str, Any]:
     settings = get_settings()
-    url = f"{settings.OLLAMA_BASE_URL}/api/generate"
-    payload = {
+    return {
         "model": model or settings.OLLAMA_MODEL, 
         "prompt": prompt, 
-        "stream": False,
+        "stream": stream,
+        # Keep the model resident between requests instead of Ollama's 5m default
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
         "options": {
             "temperature": 0.7,
             "num_predict": 150,  # Shorter responses for faster generation
@@ -19,19 +123,112 @@ async def generate_with_ollama(prompt: str, model: Optional[str] = None, max_ret
         }
     }
 
+
+async def generate_with_ollama(
+    prompt: str,
+    model: Optional[str] = None,
+    max_retries: int = 2,
+    use_cache: bool = False,
+    priority: int = PRIORITY_INTERACTIVE,
+    session_id: Optional[str] = None,
+) -> str:
+    """
+    Generate a (non-streaming) answer. With `use_cache=True` a previous answer
+    for the same model + prompt + options is returned without touching Ollama,
+    and fresh non-empty answers are stored for next time. `priority` decides
+    the place in the Ollama admission queue (see ollama_scheduler). Timeouts and
+    retries are cut to the request deadline (utils.deadline); running out of
+    time returns "" like any other failure.
+
+    With `session_id` the prompt is a follow-up turn: it continues the stored
+    Ollama context (no cache, no single-flight - the answer depends on the
+    history) on the backend that served the previous turn.
+    """
+    payload = build_payload(prompt, model)
+    if session_id:
+        return await _generate_in_session(payload, session_id, max_retries, priority)
+    key = generation_key(payload)
+    if use_cache:
+        cached = await generation_cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+    async def load() -> str:
+        response = await _generate(payload, max_retries, priority)
+        if use_cache and response:
+            await generation_cache.set(key, response)
+        return response
+
+    try:
+        return await _generate_flight.do(f"{key}:{max_retries}:{int(use_cache)}", load)
+    except DeadlineExceeded as e:
+        # Joined someone else's generation and ran out of time waiting for it
+        logging.warning(f"Ollama generate: {e}")
+        return ""
+
+
+async def _generate_in_session(payload: Dict[str, Any], session_id: str, max_retries: int, priority: int) -> str:
+    try:
+        async with _session_turn(session_id):
+            state = await _load_session(session_id, payload)
+            response = await _generate(payload, max_retries, priority, session=state)
+            if response:
+                await _save_session(session_id, state, state.pop("last", {}), state["backend"])
+            return response
+    except DeadlineExceeded as e:
+        # Ran out of time waiting for the session's previous turn
+        logging.warning(f"Ollama session turn: {e}")
+        return ""
+
+
+async def _post_generate(
+    payload: Dict[str, Any], timeout: float, priority: int, session: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    prefer = session.get("backend") if session else None
+    async with scheduler.slot(priority), pool.lease(payload["model"], prefer) as backend, \
+            track_upstream("ollama", "generate") as call:
+        r = await ollama_client().post(f"{backend.url}/api/generate", json=payload, timeout=request_timeout(timeout))
+        call.status = str(r.status_code)
+        r.raise_for_status()
+    if session is not None:
+        session["backend"] = backend.url
+    return r.json()
+
+
+async def _generate(
+    payload: Dict[str, Any],
+    max_retries: int,
+    priority: int = PRIORITY_INTERACTIVE,
+    session: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Answer text ("" on failure). `session` state gets the backend used and the final response object ("last")."""
     for attempt in range(max_retries + 1):
+        # Flexible timeout - longer for first attempt, shorter for retries - cut to
+        # whatever is left of the request deadline
+        timeout = deadline.timeout_for(60 if attempt == 0 else 30)
+        if timeout < _MIN_GENERATE_SECONDS:
+            logging.info(f"Ollama attempt {attempt + 1} skipped: {timeout:.2f}s left before the request deadline")
+            return ""
         try:
-            # Flexible timeout - longer for first attempt, shorter for retries
-            timeout = 60 if attempt == 0 else 30
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                r = await client.post(url, json=payload)
-                r.raise_for_status()
-                data = r.json()
-                response = data.get("response", "").strip()
-                if response:  # Only return non-empty responses
-                    return response
+            if attempt:
+                record_retry("ollama", "generate")
+            # Time spent queued for a slot counts against the deadline as well
+            data = await deadline.bound(_post_generate(payload, timeout, priority, session), "Ollama generate")
+            record_ollama_usage(payload["model"], data)
+            response = data.get("response", "").strip()
+            if response:  # Only return non-empty responses
+                if session is not None:
+                    session["last"] = data
+                return response
+        except OllamaOverloaded as e:
+            # Shed optional work right away - retrying would only deepen the queue
+            logging.info(f"Ollama request shed: {e}")
+            return ""
+        except DeadlineExceeded as e:
+            logging.warning(f"Ollama attempt {attempt + 1}/{max_retries + 1}: {e}")
+            return ""
         except (httpx.TimeoutException, httpx.ReadTimeout) as e:
-            logging.warning(f"Ollama timeout attempt {attempt + 1}/{max_retries + 1} ({timeout}s): {e}")
+            logging.warning(f"Ollama timeout attempt {attempt + 1}/{max_retries + 1} ({timeout:.1f}s): {e}")
             if attempt == max_retries:
                 # Don't raise exception - let caller handle fallback
                 return ""
@@ -42,3 +239,102 @@ async def generate_with_ollama(prompt: str, model: Optional[str] = None, max_ret
                 return ""
     
     return ""
+
+
+async def stream_with_ollama(
+    prompt: str,
+    model: Optional[str] = None,
+    use_cache: bool = False,
+    priority: int = PRIORITY_INTERACTIVE,
+    session_id: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream token chunks from /api/generate as they arrive (Ollama NDJSON stream).
+    Errors are logged and end the stream; callers already have their fallback content.
+    With `use_cache=True` a memoized answer is yielded as one chunk, and a
+    completed stream is stored under the same key as generate_with_ollama.
+    `session_id` continues a chat session as in generate_with_ollama; only a
+    stream that runs to `done` advances the session.
+    """
+    if session_id:
+        try:
+            async with _session_turn(session_id):
+                payload = build_payload(prompt, model, stream=True)
+                state = await _load_session(session_id, payload)
+                async for chunk in _stream(payload, priority, session=state):
+                    yield chunk
+                if "last" in state:
+                    await _save_session(session_id, state, state.pop("last"), state["backend"])
+        except DeadlineExceeded as e:
+            logging.warning(f"Ollama session stream: {e}")
+        return
+    # Cache key is computed on the non-streaming payload so both paths share entries
+    key = generation_key(build_payload(prompt, model))
+    if use_cache:
+        cached = await generation_cache.get(key)
+        if cached is not MISSING:
+            yield cached
+            return
+    parts = []
+    turn: Dict[str, Any] = {}
+    async for chunk in _stream(build_payload(prompt, model, stream=True), priority, turn):
+        parts.append(chunk)
+        yield chunk
+    text = "".join(parts).strip()
+    if use_cache and text and "last" in turn:  # only streams that reached `done`
+        await generation_cache.set(key, text)
+
+
+async def _stream(
+    payload: Dict[str, Any], priority: int, session: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[str]:
+    """
+    Token chunks of one streamed generation. Like _generate, `session` (any
+    state dict) gets the backend used and the final `done` object ("last").
+    Timeouts are cut to the request deadline, and the wait for the first
+    chunk (slot queue + prompt evaluation) is bounded by it.
+    """
+    timeout = deadline.timeout_for(60)
+    if timeout < _MIN_GENERATE_SECONDS:
+        logging.info(f"Ollama stream skipped: {timeout:.2f}s left before the request deadline")
+        return
+    chunks = _stream_chunks(payload, priority, timeout, session)
+    try:
+        first = await deadline.bound(anext(chunks, None), "Ollama stream")
+        if first is None:
+            return
+        yield first
+        async for chunk in chunks:
+            yield chunk
+    except DeadlineExceeded as e:
+        logging.warning(f"Ollama stream: {e}")
+    finally:
+        await chunks.aclose()
+
+
+async def _stream_chunks(
+    payload: Dict[str, Any], priority: int, timeout: float, session: Optional[Dict[str, Any]]
+) -> AsyncIterator[str]:
+    prefer = session.get("backend") if session else None
+    try:
+        async with scheduler.slot(priority), pool.lease(payload["model"], prefer) as backend, \
+                track_upstream("ollama", "generate_stream") as call, \
+                ollama_client().stream("POST", f"{backend.url}/api/generate", json=payload, timeout=request_timeout(timeout)) as r:
+            call.status = str(r.status_code)
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                chunk = data.get("response", "")
+                if chunk:
+                    yield chunk
+                if data.get("done"):
+                    record_ollama_usage(payload["model"], data)
+                    if session is not None:
+                        session.update(backend=backend.url, last=data)
+                    break
+    except OllamaOverloaded as e:
+        logging.info(f"Ollama stream shed: {e}")
+    except Exception as e:
+        logging.warning(f"Ollama stream error: {e}")
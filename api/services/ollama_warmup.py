@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from config import get_settings
+from services.http_clients import ollama_client, request_timeout
+from services.ollama_pool import OllamaBackend, pool
+from utils.metrics import track_upstream
+
+logger = logging.getLogger(__name__)
+
+
+def warm_models() -> List[str]:
+    settings = get_settings()
+    extras = [m.strip() for m in settings.OLLAMA_WARM_MODELS.split(",") if m.strip()]
+    return list(dict.fromkeys([settings.OLLAMA_MODEL, *extras]))
+
+
+async def load_model(backend: OllamaBackend, model: str) -> bool:
+    """
+    Ask one backend to load `model` into memory. An empty prompt makes Ollama
+    load the model and return immediately without generating anything.
+    """
+    settings = get_settings()
+    payload = {"model": model, "prompt": "", "stream": False, "keep_alive": settings.OLLAMA_KEEP_ALIVE}
+    started = time.monotonic()
+    try:
+        # Cold loads of a few GB from disk can take a while
+        async with track_upstream("ollama", "load") as call:
+            r = await ollama_client().post(f"{backend.url}/api/generate", json=payload, timeout=request_timeout(300))
+            call.status = str(r.status_code)
+            r.raise_for_status()
+    except Exception as e:
+        logger.warning("Warm-up of %s on %s failed: %s", model, backend.url, e)
+        return False
+    logger.info("Model %s warm on %s (%.1fs)", model, backend.url, time.monotonic() - started)
+    return True
+
+
+async def warm_up() -> None:
+    """Load every warm model on every healthy backend that has it (idempotent when already loaded)."""
+    jobs = [
+        load_model(backend, model)
+        for backend in pool.healthy
+        for model in warm_models()
+        if backend.has_model(model)
+    ]
+    await asyncio.gather(*jobs)
+
+
+class KeepWarm:
+    """Startup warm-up followed by a periodic re-ping so idle models stay loaded."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+
+    async def _run(self) -> None:
+        if not pool.catalogue_at:
+            # Know which backend has which model before loading anything
+            await pool.probe_all()
+        while True:
+            try:
+                await warm_up()
+                self.runs += 1
+            except Exception as e:
+                logger.warning("Keep-warm run failed: %s", e)
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="ollama-keep-warm")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+keep_warm = KeepWarm(get_settings().OLLAMA_KEEP_WARM_INTERVAL)
@@ -0,0 +1,200 @@
+"""
+In-memory spatial index of places seen in Places Text Search results.
+
+Coordinates live in growable NumPy arrays (one row per place_id) bucketed by
+a fixed lat/lng grid, so a radius query touches only the grid cells under the
+circle and filters them with one vectorized haversine. Alongside the places,
+the index remembers *coverage*: which (query, circle) searches went to Google
+and when. A new search is answered locally only when a fresh covering search
+for the same query contains its whole circle; otherwise the caller falls back
+to Google and the result is recorded here.
+"""
+import math
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import get_settings
+from models.schemas import PlaceItem
+from services import geometry as geo
+from utils.cache import register_cache
+
+_M_PER_DEG_LAT = 111_320.0
+
+
+class _Coverage:
+    __slots__ = ("lat", "lng", "radius", "fetched_at")
+
+    def __init__(self, lat: float, lng: float, radius: float, fetched_at: float) -> None:
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.fetched_at = fetched_at
+
+
+class PlaceIndex:
+    def __init__(
+        self,
+        cell_deg: float,
+        place_ttl: float,
+        coverage_ttl: float,
+        max_places: int,
+        min_results: int,
+        limit: int = 10,
+    ) -> None:
+        self.name = "place_index"
+        self.cell_deg = cell_deg
+        self.place_ttl = place_ttl
+        self.coverage_ttl = coverage_ttl
+        self.max_places = max_places
+        self.min_results = min_results
+        self.limit = limit
+
+        capacity = 1024
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lng = np.empty(capacity, dtype=np.float64)
+        self._seen = np.empty(capacity, dtype=np.float64)
+        self._items: List[dict] = []
+        self._queries: List[Set[str]] = []
+        self._rows: Dict[str, int] = {}  # place_id -> row
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        self._coverage: Dict[str, List[_Coverage]] = {}
+
+        self.hits_index = 0
+        self.misses = 0
+        register_cache(self)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def _grow(self) -> None:
+        capacity = len(self._lat) * 2
+        for attr in ("_lat", "_lng", "_seen"):
+            old = getattr(self, attr)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, attr, new)
+
+    def _prune(self, now: float) -> None:
+        """Drop stale places and rebuild the arrays (only when the index is full)."""
+        n = len(self._items)
+        keep = np.flatnonzero(self._seen[:n] >= now - self.place_ttl)
+        items = [self._items[i] for i in keep]
+        queries = [self._queries[i] for i in keep]
+        lat, lng, seen = self._lat[keep], self._lng[keep], self._seen[keep]
+        self._items, self._queries, self._rows, self._grid = [], [], {}, {}
+        self._lat[: len(keep)], self._lng[: len(keep)], self._seen[: len(keep)] = lat, lng, seen
+        for row, item in enumerate(items):
+            self._items.append(item)
+            self._queries.append(queries[row])
+            self._rows[item["place_id"]] = row
+            self._grid.setdefault(self._cell(lat[row], lng[row]), []).append(row)
+
+    def add(self, item: PlaceItem, query: str, now: Optional[float] = None) -> None:
+        if item.lat is None or item.lng is None or not item.place_id:
+            return
+        now = time.time() if now is None else now
+        row = self._rows.get(item.place_id)
+        if row is not None:
+            old_cell = self._cell(self._lat[row], self._lng[row])
+            new_cell = self._cell(item.lat, item.lng)
+            if old_cell != new_cell:
+                self._grid[old_cell].remove(row)
+                self._grid.setdefault(new_cell, []).append(row)
+        else:
+            if len(self._items) >= self.max_places:
+                self._prune(now)
+                if len(self._items) >= self.max_places:
+                    return
+            row = len(self._items)
+            if row >= len(self._lat):
+                self._grow()
+            self._items.append({})
+            self._queries.append(set())
+            self._rows[item.place_id] = row
+            self._grid.setdefault(self._cell(item.lat, item.lng), []).append(row)
+        self._lat[row], self._lng[row], self._seen[row] = item.lat, item.lng, now
+        self._items[row] = item.model_dump()
+        self._queries[row].add(query)
+
+    def record(self, query: str, lat: float, lng: float, radius: float, items: List[PlaceItem]) -> None:
+        """Store a Google result set and mark its circle as covered for `query`."""
+        now = time.time()
+        for item in items:
+            self.add(item, query, now)
+        covered = [c for c in self._coverage.get(query, []) if c.fetched_at >= now - self.coverage_ttl]
+        covered.append(_Coverage(lat, lng, radius, now))
+        self._coverage[query] = covered
+        if len(self._coverage) > self.max_places:
+            # Many one-off queries: forget those whose coverage has expired
+            cutoff = now - self.coverage_ttl
+            self._coverage = {q: cs for q, cs in self._coverage.items() if cs[-1].fetched_at >= cutoff}
+
+    def _covered(self, query: str, lat: float, lng: float, radius: float, now: float) -> bool:
+        for c in self._coverage.get(query, ()):
+            if c.fetched_at < now - self.coverage_ttl:
+                continue
+            d = geo.distances_m(lat, lng, np.array([c.lat]), np.array([c.lng]))[0]
+            if d + radius <= c.radius:
+                return True
+        return False
+
+    def _candidates(self, lat: float, lng: float, radius: float) -> np.ndarray:
+        dlat = radius / _M_PER_DEG_LAT
+        dlng = radius / (_M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        (i0, j0), (i1, j1) = self._cell(lat - dlat, lng - dlng), self._cell(lat + dlat, lng + dlng)
+        rows: List[int] = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                rows.extend(self._grid.get((i, j), ()))
+        return np.asarray(rows, dtype=np.int64)
+
+    def search(self, query: str, lat: float, lng: float, radius: float) -> Optional[List[PlaceItem]]:
+        """
+        Nearest known places matching `query` within `radius` metres, or None
+        when the area isn't freshly covered (or too few places are known).
+        """
+        now = time.time()
+        if not self._covered(query, lat, lng, radius, now):
+            self.misses += 1
+            return None
+        rows = self._candidates(lat, lng, radius)
+        if len(rows):
+            rows = rows[self._seen[rows] >= now - self.place_ttl]
+            rows = rows[np.fromiter((query in self._queries[r] for r in rows), dtype=bool, count=len(rows))]
+        if len(rows):
+            dist = geo.distances_m(lat, lng, self._lat[rows], self._lng[rows])
+            inside = dist <= radius
+            rows, dist = rows[inside], dist[inside]
+            rows = rows[np.argsort(dist, kind="stable")][: self.limit]
+        if len(rows) < self.min_results:
+            self.misses += 1
+            return None
+        self.hits_index += 1
+        return [PlaceItem(**self._items[r]) for r in rows]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits_index + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.max_places,
+            "cells": len(self._grid),
+            "covered_queries": len(self._coverage),
+            "hits_index": self.hits_index,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits_index / lookups, 4) if lookups else 0.0,
+        }
+
+
+_settings = get_settings()
+place_index = PlaceIndex(
+    cell_deg=_settings.PLACE_INDEX_CELL_DEG,
+    place_ttl=_settings.PLACE_INDEX_TTL,
+    coverage_ttl=_settings.PLACE_INDEX_COVERAGE_TTL,
+    max_places=_settings.PLACE_INDEX_MAX_PLACES,
+    min_results=_settings.PLACE_INDEX_MIN_RESULTS,
+)
@@ -0,0 +1,54 @@
+import asyncio
+import contextvars
+import logging
+from typing import Any, Coroutine, Optional, Set, TypeVar
+
+from utils import deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Strong references to fire-and-forget tasks (asyncio only keeps weak ones)
+_tasks: Set["asyncio.Task[Any]"] = set()
+
+
+def _on_done(task: "asyncio.Task[Any]") -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.info("Background task %s failed: %s", task.get_name(), task.exception())
+
+
+def track(task: "asyncio.Task[T]") -> "asyncio.Task[T]":
+    """Keep a task alive after its caller stops awaiting it; failures are logged, not raised."""
+    if task not in _tasks:
+        _tasks.add(task)
+        task.add_done_callback(_on_done)
+    return task
+
+
+def spawn(coro: Coroutine[Any, Any, T], name: Optional[str] = None) -> "asyncio.Task[T]":
+    # Detached work outlives the request that started it: don't inherit its deadline
+    context = contextvars.copy_context()
+    context.run(deadline.set_deadline, None)
+    return track(asyncio.create_task(coro, name=name, context=context))
+
+
+async def await_within(task: "asyncio.Task[T]", budget: float) -> Optional[T]:
+    """
+    Wait at most `budget` seconds for `task`. On expiry return None and leave
+    the task running detached (tracked) so its result is not wasted.
+    """
+    done, _ = await asyncio.wait({task}, timeout=max(budget, 0))
+    if task in done:
+        return task.result()
+    track(task)
+    return None
+
+
+async def shutdown() -> None:
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,184 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.redis_client import get_redis, mark_redis_down
+
+logger = logging.getLogger(__name__)
+
+# Sentinel so that falsy cached values (e.g. []) are still hits
+MISSING = object()
+
+
+class LRUCache:
+    """Bounded in-process LRU with per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    Two-tier cache: in-process LRU (L1) in front of Redis (L2).
+
+    Values must be JSON-serializable. Redis errors never propagate: the cache
+    simply behaves as L1-only until Redis is reachable again.
+
+    With `stale_ttl` > 0, values are also kept in process for that long after
+    they stop being fresh; get_stale() returns them so callers can answer
+    immediately and refresh in the background (stale-while-revalidate).
+
+    Redis entries carry the time they were stored: one older than `ttl` is
+    not fresh, however long Redis keeps it (redis_ttl is usually longer), so
+    get() misses and the value is only available through get_stale().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl: float,
+        redis_ttl: Optional[float] = None,
+        enabled: bool = True,
+        stale_ttl: float = 0,
+    ) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.redis_ttl = int(redis_ttl if redis_ttl is not None else ttl)
+        self.l1 = LRUCache(maxsize, ttl)
+        # Same objects as l1, held past their freshness (see get_stale)
+        self.stale = LRUCache(maxsize, ttl + stale_ttl) if stale_ttl > 0 else None
+        self.hits_l1 = 0
+        self.hits_l2 = 0
+        self.hits_stale = 0
+        self.misses = 0
+        register_cache(self)
+
+    def _redis_key(self, key: str) -> str:
+        # v2: values are stored as {"at": epoch seconds, "value": ...}
+        return f"heypico:v2:{self.name}:{key}"
+
+    async def get(self, key: str) -> Any:
+        if not self.enabled:
+            return MISSING
+        value = self.l1.get(key)
+        if value is not MISSING:
+            self.hits_l1 += 1
+            return value
+
+        redis = get_redis() if self.redis_ttl > 0 else None
+        if redis is not None:
+            try:
+                raw = await redis.get(self._redis_key(key))
+            except Exception as e:
+                mark_redis_down(e)
+                raw = None
+            if raw is not None:
+                entry = json.loads(raw)
+                value = entry["value"]
+                age = max(0.0, time.time() - entry["at"])
+                if age < self.l1.ttl:
+                    # Fresh for what is left of its TTL, not a whole new one
+                    self.l1.set(key, value, ttl=self.l1.ttl - age)
+                    if self.stale is not None:
+                        self.stale.set(key, value, ttl=self.stale.ttl - age)
+                    self.hits_l2 += 1
+                    return value
+                if self.stale is not None and age < self.stale.ttl:
+                    self.stale.set(key, value, ttl=self.stale.ttl - age)
+
+        self.misses += 1
+        return MISSING
+
+    async def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        self.l1.set(key, value)
+        if self.stale is not None:
+            self.stale.set(key, value)
+        redis = get_redis() if self.redis_ttl > 0 else None
+        if redis is not None:
+            try:
+                await redis.set(self._redis_key(key), json.dumps({"at": time.time(), "value": value}), ex=self.redis_ttl)
+            except Exception as e:
+                mark_redis_down(e)
+
+    async def delete(self, key: str) -> None:
+        self.l1.delete(key)
+        if self.stale is not None:
+            self.stale.delete(key)
+        redis = get_redis() if self.redis_ttl > 0 else None
+        if redis is not None:
+            try:
+                await redis.delete(self._redis_key(key))
+            except Exception as e:
+                mark_redis_down(e)
+
+    def get_stale(self, key: str) -> Any:
+        """Last value stored for `key` within the stale window (call after a get() miss)."""
+        if not self.enabled or self.stale is None:
+            return MISSING
+        value = self.stale.get(key)
+        if value is not MISSING:
+            self.hits_stale += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_l1 + self.hits_l2 + self.misses
+        return {
+            "size": len(self.l1),
+            "maxsize": self.l1.maxsize,
+            "hits_l1": self.hits_l1,
+            "hits_l2": self.hits_l2,
+            "hits_stale": self.hits_stale,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits_l1 + self.hits_l2) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_caches: Dict[str, Any] = {}
+
+
+def register_cache(cache: Any) -> None:
+    """
+    Report a cache in /stats and /metrics. Anything with a `name` and a
+    stats() dict using the TieredCache keys (hits_<tier>, misses, size,
+    hit_ratio) can be registered, not only TieredCache.
+    """
+    _caches[cache.name] = cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,147 @@
+"""
+Request-scoped deadlines.
+
+DeadlineMiddleware sets an absolute deadline for each request, taken from the
+X-Request-Timeout header (seconds, capped by REQUEST_DEADLINE_MAX) or from the
+per-route default in REQUEST_DEADLINE_ROUTES. It lives in a ContextVar, so
+everything awaited on behalf of the request sees it: upstream calls size their
+timeouts with timeout_for() and stop retrying once too little is left.
+Fire-and-forget work (utils.background.spawn) runs without a deadline.
+"""
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Dict, Optional, TypeVar
+
+from config import get_settings
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() value, or None when the request has no deadline
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before (or while) calling an upstream."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request (never negative), or None without a deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def timeout_for(default: float) -> float:
+    """`default`, shrunk to the time left."""
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def check(what: str = "request") -> None:
+    if remaining() == 0.0:
+        raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """Start a deadline `seconds` from now (None clears it). Never extends an existing one."""
+    if seconds is None:
+        return _deadline.set(None)
+    deadline = time.monotonic() + max(0.0, seconds)
+    current = _deadline.get()
+    return _deadline.set(deadline if current is None else min(current, deadline))
+
+
+def reset(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+def current() -> Optional[float]:
+    """The absolute deadline (time.monotonic()) of the current context, or None."""
+    return _deadline.get()
+
+
+def extend_to(absolute: Optional[float]) -> None:
+    """
+    Move the current context's deadline to `absolute` if that is later (None
+    = no deadline). Only for work shared by several requests (SingleFlight),
+    which may take as long as its most patient caller.
+    """
+    current_deadline = _deadline.get()
+    if current_deadline is not None and (absolute is None or absolute > current_deadline):
+        _deadline.set(absolute)
+
+
+async def bound(aw: Awaitable[T], what: str = "request") -> T:
+    """
+    Await `aw` for at most the time left; DeadlineExceeded when it runs out.
+    The deadline is re-read when the wait expires, so an extension made
+    meanwhile (extend_to) is honoured.
+    """
+    left = remaining()
+    if left is None:
+        return await aw
+    fut = asyncio.ensure_future(aw)
+    try:
+        while True:
+            done, _ = await asyncio.wait({fut}, timeout=left)
+            if done:
+                return fut.result()
+            left = remaining()
+            if left is None:
+                return await fut
+            if left <= 0:
+                break
+        fut.cancel()
+        await asyncio.gather(fut, return_exceptions=True)
+        if not fut.cancelled() and fut.exception() is None:
+            return fut.result()  # finished while being cancelled
+        raise DeadlineExceeded(f"Deadline exceeded during {what}")
+    finally:
+        fut.cancel()
+
+
+def parse_routes(spec: str) -> Dict[str, float]:
+    """'/chat=60,/maps/places=15' -> {'/chat': 60.0, '/maps/places': 15.0}"""
+    routes: Dict[str, float] = {}
+    for part in spec.split(","):
+        path, _, seconds = part.strip().partition("=")
+        if path and seconds:
+            routes[path.strip().rstrip("/") or "/"] = float(seconds)
+    return routes
+
+
+class DeadlineMiddleware:
+    """Pure ASGI, like MetricsMiddleware, so streamed bodies run under the same deadline."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        settings = get_settings()
+        self.header = settings.REQUEST_DEADLINE_HEADER.lower().encode("latin-1")
+        self.default = settings.REQUEST_DEADLINE_DEFAULT
+        self.maximum = settings.REQUEST_DEADLINE_MAX
+        self.routes = parse_routes(settings.REQUEST_DEADLINE_ROUTES)
+
+    def _seconds(self, scope) -> Optional[float]:
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                try:
+                    seconds = float(value)
+                except ValueError:
+                    break
+                if seconds > 0:
+                    return min(seconds, self.maximum) if self.maximum > 0 else seconds
+                break
+        seconds = self.routes.get(scope["path"].rstrip("/") or "/", self.default)
+        return seconds if seconds > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = set_deadline(self._seconds(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset(token)
@@ -0,0 +1,73 @@
+from typing import Optional, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Approximate geohash cell width (metres, at the equator) per precision level
+GEOHASH_CELL_METERS = {
+    1: 5_000_000,
+    2: 1_250_000,
+    3: 156_000,
+    4: 39_100,
+    5: 4_890,
+    6: 1_220,
+    7: 153,
+    8: 38,
+}
+
+
+def parse_latlng(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse 'lat,lng' into floats; returns None for empty or malformed input."""
+    if not location:
+        return None
+    try:
+        lat_s, lng_s = location.split(",")
+        lat, lng = float(lat_s), float(lng_s)
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def geohash_encode(lat: float, lng: float, precision: int) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    out = []
+    bit, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            out.append(_BASE32[ch])
+            bit, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_precision_for_radius(radius_m: float, cell_fraction: float = 0.25) -> int:
+    """
+    Coarsest geohash precision whose cells are no wider than
+    `cell_fraction * radius_m`, so snapping the search centre to a cell moves
+    it by only a small part of the search radius.
+    """
+    target = max(radius_m, 1) * cell_fraction
+    for precision in sorted(GEOHASH_CELL_METERS):
+        if GEOHASH_CELL_METERS[precision] <= target:
+            return precision
+    return max(GEOHASH_CELL_METERS)
+
@@ -0,0 +1,278 @@
+"""
+Prometheus metrics for the hot paths.
+
+Event-style series (upstream latency, retries, timeouts, hedges, Ollama token
+throughput, Ollama queue wait vs. generation time, per-route latency,
+rate-limit rejections) are recorded where they happen. Counters that subsystems already keep for /stats (caches,
+single-flight, connection pools, Ollama scheduler/backends, circuit breakers)
+are read at scrape time by StatsCollector, so nothing is counted twice.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Maps calls are sub-second when healthy; Ollama generations run to tens of seconds
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+UPSTREAM_LATENCY = Histogram(
+    "heypico_upstream_request_seconds",
+    "Latency of calls to Google Maps / Ollama",
+    ["upstream", "endpoint", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_RETRIES = Counter(
+    "heypico_upstream_retries_total",
+    "Upstream calls repeated after a failed attempt",
+    ["upstream", "endpoint"],
+)
+UPSTREAM_TIMEOUTS = Counter(
+    "heypico_upstream_timeouts_total",
+    "Upstream calls that hit their timeout",
+    ["upstream", "endpoint"],
+)
+UPSTREAM_HEDGES = Counter(
+    "heypico_upstream_hedges_total",
+    "Hedged upstream calls by the copy that answered first (primary|hedge)",
+    ["upstream", "endpoint", "winner"],
+)
+OLLAMA_TOKENS = Counter(
+    "heypico_ollama_tokens_total",
+    "Tokens processed by Ollama (phase=prompt|eval)",
+    ["model", "phase"],
+)
+OLLAMA_TOKENS_PER_SECOND = Histogram(
+    "heypico_ollama_eval_tokens_per_second",
+    "Generation speed per request (eval_count / eval_duration)",
+    ["model"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200),
+)
+OLLAMA_QUEUE_WAIT = Histogram(
+    "heypico_ollama_queue_wait_seconds",
+    "Time a generation waited for a scheduler slot, per priority class",
+    ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+OLLAMA_GENERATION = Histogram(
+    "heypico_ollama_generation_seconds",
+    "Time a generation held its scheduler slot, per priority class",
+    ["priority"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    "heypico_http_request_seconds",
+    "Latency of API requests per route, including streamed bodies",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "heypico_rate_limit_rejections_total",
+    "Requests rejected with 429 by the rate limiter",
+    ["route"],
+)
+
+
+class UpstreamCall:
+    """Handle yielded by track_upstream(); set `status` once a response is in."""
+
+    __slots__ = ("status",)
+
+    def __init__(self) -> None:
+        self.status: Optional[str] = None
+
+
+@asynccontextmanager
+async def track_upstream(upstream: str, endpoint: str) -> AsyncIterator[UpstreamCall]:
+    """
+    Time one upstream call. Status label is the HTTP status (set by the caller,
+    or taken from HTTPStatusError), "timeout", "cancelled" or "error".
+    """
+    call = UpstreamCall()
+    started = time.perf_counter()
+    status = "error"
+    try:
+        yield call
+    except httpx.TimeoutException:
+        status = "timeout"
+        UPSTREAM_TIMEOUTS.labels(upstream, endpoint).inc()
+        raise
+    except httpx.HTTPStatusError as e:
+        status = str(e.response.status_code)
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        # Caller went away (client disconnect, stream closed early)
+        status = "cancelled"
+        raise
+    else:
+        status = call.status or "ok"
+    finally:
+        UPSTREAM_LATENCY.labels(upstream, endpoint, status).observe(time.perf_counter() - started)
+
+
+def record_retry(upstream: str, endpoint: str) -> None:
+    UPSTREAM_RETRIES.labels(upstream, endpoint).inc()
+
+
+def record_hedge(upstream: str, endpoint: str, winner: str) -> None:
+    UPSTREAM_HEDGES.labels(upstream, endpoint, winner).inc()
+
+
+def record_ollama_usage(model: str, data: Dict[str, Any]) -> None:
+    """Token counts and speed from the final /api/generate object (durations are ns)."""
+    prompt_tokens = data.get("prompt_eval_count") or 0
+    eval_tokens = data.get("eval_count") or 0
+    eval_ns = data.get("eval_duration") or 0
+    if prompt_tokens:
+        OLLAMA_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    if eval_tokens:
+        OLLAMA_TOKENS.labels(model, "eval").inc(eval_tokens)
+        if eval_ns > 0:
+            OLLAMA_TOKENS_PER_SECOND.labels(model).observe(eval_tokens / (eval_ns / 1e9))
+
+
+def record_ollama_slot(priority: str, wait: float, generation: float) -> None:
+    OLLAMA_QUEUE_WAIT.labels(priority).observe(wait)
+    OLLAMA_GENERATION.labels(priority).observe(generation)
+
+
+def route_label(scope: Dict[str, Any]) -> str:
+    # Route template ("/maps/directions"), not the raw path, to keep cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (not BaseHTTPMiddleware) so the timer stops when the
+    last body chunk is sent - SSE/streamed responses are measured end to end.
+    """
+
+    def __init__(self, app, exclude: Iterable[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_LATENCY.labels(scope["method"], route_label(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+class StatsCollector(Collector):
+    """
+    Exposes the /stats counters as Prometheus series at scrape time.
+
+    Caches report through utils.cache.register_cache: any object with a `name`
+    and a stats() dict holding `hits_<tier>` / `misses` / `size` shows up here
+    without further wiring.
+    """
+
+    def describe(self):
+        # Without this, register() would call collect() while modules are still importing
+        return []
+
+    def collect(self):
+        # Imported lazily: these modules build their singletons from settings
+        from services.http_clients import registry as http_clients
+        from services.ollama_pool import pool as ollama_pool
+        from services.ollama_scheduler import scheduler as ollama_scheduler
+        from utils.cache import cache_stats
+        from utils.rate_limit import limiter
+        from utils.resilience import breaker_stats
+        from utils.singleflight import singleflight_stats
+
+        hits = CounterMetricFamily("heypico_cache_hits", "Cache hits", labels=["cache", "tier"])
+        misses = CounterMetricFamily("heypico_cache_misses", "Cache misses", labels=["cache"])
+        size = GaugeMetricFamily("heypico_cache_entries", "Entries held in process", labels=["cache"])
+        ratio = GaugeMetricFamily("heypico_cache_hit_ratio", "Hits / lookups since start", labels=["cache"])
+        for name, s in cache_stats().items():
+            for key, value in s.items():
+                if key.startswith("hits_"):
+                    hits.add_metric([name, key[len("hits_"):]], value)
+            misses.add_metric([name], s.get("misses", 0))
+            size.add_metric([name], s.get("size", 0))
+            ratio.add_metric([name], s.get("hit_ratio", 0.0))
+        yield from (hits, misses, size, ratio)
+
+        calls = CounterMetricFamily("heypico_singleflight_calls", "Single-flight lookups", labels=["flight"])
+        collapsed = CounterMetricFamily(
+            "heypico_singleflight_collapsed", "Lookups that joined an in-flight call", labels=["flight"]
+        )
+        for name, s in singleflight_stats().items():
+            calls.add_metric([name], s["calls"])
+            collapsed.add_metric([name], s["collapsed"])
+        yield from (calls, collapsed)
+
+        conns = GaugeMetricFamily(
+            "heypico_http_pool_connections", "Upstream pool connections", labels=["upstream", "state"]
+        )
+        for name, s in http_clients.stats().items():
+            if s.get("connections") is not None:
+                conns.add_metric([name, "idle"], s["idle"])
+                conns.add_metric([name, "active"], s["active"])
+        yield conns
+
+        sched = ollama_scheduler.stats()
+        yield GaugeMetricFamily("heypico_ollama_running", "Generations holding a slot", value=sched["running"])
+        yield GaugeMetricFamily("heypico_ollama_queued", "Generations waiting for a slot", value=sched["queued"])
+        yield GaugeMetricFamily("heypico_ollama_capacity", "Generation slots", value=sched["max_concurrency"])
+        yield CounterMetricFamily("heypico_ollama_shed", "Enrichment requests shed", value=sched["shed"])
+
+        healthy = GaugeMetricFamily("heypico_ollama_backend_healthy", "1 if in rotation", labels=["backend"])
+        outstanding = GaugeMetricFamily(
+            "heypico_ollama_backend_outstanding", "In-flight requests", labels=["backend"]
+        )
+        for url, s in ollama_pool.stats().items():
+            healthy.add_metric([url], 1 if s["healthy"] else 0)
+            outstanding.add_metric([url], s["outstanding"])
+        yield from (healthy, outstanding)
+
+        state = GaugeMetricFamily(
+            "heypico_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", labels=["breaker"]
+        )
+        opened = CounterMetricFamily("heypico_circuit_opened", "Times the circuit opened", labels=["breaker"])
+        rejected = CounterMetricFamily(
+            "heypico_circuit_short_circuited", "Calls failed fast while open", labels=["breaker"]
+        )
+        error_rate = GaugeMetricFamily(
+            "heypico_circuit_error_rate", "Error rate over the breaker window", labels=["breaker"]
+        )
+        for name, s in breaker_stats().items():
+            state.add_metric([name], {"closed": 0, "half_open": 1, "open": 2}[s["state"]])
+            opened.add_metric([name], s["opened"])
+            rejected.add_metric([name], s["short_circuited"])
+            error_rate.add_metric([name], s["window_error_rate"])
+        yield from (state, opened, rejected, error_rate)
+
+        rl = limiter.stats()
+        yield GaugeMetricFamily("heypico_rate_limit_clients", "Tracked rate-limit buckets", value=rl["clients"])
+        yield GaugeMetricFamily(
+            "heypico_rate_limit_redis_synced", "1 if buckets sync through Redis", value=int(rl["mode"] == "redis")
+        )
+
+
+REGISTRY.register(StatsCollector())
+
+
+def render_latest():
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,16 +1,185 @@
 import asyncio
 import logging
-from fastapi_limiter import FastAPILimiter
-from redis.asyncio import Redis
+import time
+from typing import Any, Dict, Optional, Tuple
+
 from config import get_settings
+from utils.redis_client import get_redis, mark_redis_down
 
 logger = logging.getLogger(__name__)
 
+# Atomically add each replica's pending hits to the shared per-window counters
+# and return the global totals. KEYS = counter keys, ARGV[1] = ttl,
+# ARGV[2..] = increments (same order as KEYS).
+_SYNC_SCRIPT = """
+local out = {}
+for i, key in ipairs(KEYS) do
+  local inc = tonumber(ARGV[i + 1])
+  local total = redis.call('INCRBY', key, inc)
+  if redis.call('TTL', key) < 0 then
+    redis.call('EXPIRE', key, ARGV[1])
+  end
+  out[i] = total
+end
+return out
+"""
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "pending", "window")
+
+    def __init__(self, capacity: float, now: float) -> None:
+        self.tokens = capacity
+        self.updated = now
+        # Hits not yet pushed to Redis, all in the per-minute `window`
+        self.pending = 0
+        self.window = 0
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token bucket answered in-process (no Redis round-trip per hit).
+
+    A background task periodically pushes each replica's hit counts to Redis
+    (one Lua script call for all keys) and clamps local buckets to what is left
+    of the shared per-minute window, so the limit holds across replicas. If
+    Redis is unreachable the limiter keeps enforcing limits locally.
+    """
+
+    def __init__(self, per_minute: int, sync_interval: float = 1.0) -> None:
+        self.capacity = float(per_minute)
+        self.refill_rate = per_minute / 60.0
+        self.sync_interval = sync_interval
+        self._buckets: Dict[str, _Bucket] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._script = None
+        self.allowed = 0
+        self.rejected = 0
+        self.mode = "local"
+        self.last_sync: Optional[float] = None
+
+    def _refill(self, bucket: _Bucket, now: float) -> None:
+        bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.refill_rate)
+        bucket.updated = now
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """Consume one token for `key`. Returns (allowed, retry_after_seconds)."""
+        if self.capacity <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.capacity, now)
+        else:
+            self._refill(bucket, now)
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            window = int(time.time() // 60)
+            if bucket.window != window:
+                # Unsent hits from an earlier minute no longer count against anyone
+                bucket.pending = 0
+                bucket.window = window
+            bucket.pending += 1
+            self.allowed += 1
+            return True, 0.0
+        self.rejected += 1
+        return False, (1 - bucket.tokens) / self.refill_rate
+
+    async def sync(self) -> None:
+        """Reconcile local buckets with the shared Redis window counters."""
+        now = time.monotonic()
+        window = int(time.time() // 60)
+        for bucket in self._buckets.values():
+            if bucket.window != window:
+                bucket.pending = 0
+        # Forget idle clients whose bucket has fully refilled
+        for key in [k for k, b in self._buckets.items() if not b.pending and b.updated < now - 60]:
+            del self._buckets[key]
+
+        redis = get_redis()
+        if redis is None:
+            self._drop_pending()
+            self.mode = "local"
+            return
+        keys = [k for k, b in self._buckets.items() if b.pending]
+        if not keys:
+            self.mode = "redis"
+            return
+        if self._script is None:
+            self._script = redis.register_script(_SYNC_SCRIPT)
+        pending = [self._buckets[k].pending for k in keys]
+        try:
+            totals = await self._script(
+                keys=[f"heypico:rl:{k}:{window}" for k in keys],
+                args=[120, *pending],
+            )
+        except Exception as e:
+            mark_redis_down(e)
+            self._script = None
+            self._drop_pending()
+            self.mode = "local"
+            return
+
+        now = time.monotonic()
+        for key, sent, total in zip(keys, pending, totals):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            if bucket.window == window:
+                bucket.pending = max(0, bucket.pending - sent)
+            self._refill(bucket, now)
+            # Other replicas' hits in this window count against our allowance too
+            bucket.tokens = min(bucket.tokens, max(0.0, self.capacity - int(total)))
+        self.mode = "redis"
+        self.last_sync = time.time()
+
+    def _drop_pending(self) -> None:
+        # Local buckets already enforced these hits; replaying them into a later
+        # Redis window would throttle clients for traffic from earlier minutes
+        for bucket in self._buckets.values():
+            bucket.pending = 0
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning("Rate limiter sync failed: %s", e)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="rate-limit-sync")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "per_minute": int(self.capacity),
+            "clients": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "last_sync": self.last_sync,
+        }
+
+
+_settings = get_settings()
+limiter = TokenBucketLimiter(_settings.RATE_LIMIT_PER_MINUTE, _settings.RATE_LIMIT_SYNC_INTERVAL)
+
+
 async def init_rate_limiter():
-    settings = get_settings()
-    try:
-        redis = Redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-        await FastAPILimiter.init(redis)
-        logger.info("Rate limiter initialized with Redis.")
-    except Exception as e:
-        logger.warning("Rate limiter not active (Redis issue): %s", e)
+    limiter.start()
+    logger.info("Rate limiter initialized (%s req/min, Redis sync every %ss).",
+                _settings.RATE_LIMIT_PER_MINUTE, _settings.RATE_LIMIT_SYNC_INTERVAL)
+
+
+async def close_rate_limiter():
+    await limiter.stop()
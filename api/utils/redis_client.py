@@ -0,0 +1,47 @@
+import logging
+import time
+from typing import Optional
+
+from redis.asyncio import Redis
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# After a Redis failure, skip Redis for this many seconds instead of paying
+# the connect timeout on every request.
+_BACKOFF_SECONDS = 30.0
+
+_redis: Optional[Redis] = None
+_down_until = 0.0
+
+
+def get_redis() -> Optional[Redis]:
+    """Shared Redis client, or None while Redis is considered unavailable."""
+    global _redis
+    if time.monotonic() < _down_until:
+        return None
+    if _redis is None:
+        settings = get_settings()
+        _redis = Redis.from_url(
+            settings.REDIS_URL,
+            encoding="utf-8",
+            decode_responses=True,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+    return _redis
+
+
+def mark_redis_down(err: Exception) -> None:
+    """Record a Redis failure; callers fall back to in-process state for a while."""
+    global _down_until
+    if time.monotonic() >= _down_until:
+        logger.warning("Redis unavailable, falling back to local state for %ss: %s", _BACKOFF_SECONDS, err)
+    _down_until = time.monotonic() + _BACKOFF_SECONDS
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,318 @@
+"""
+Failure handling for upstream calls: per-endpoint circuit breakers and
+jittered retries for transient failures.
+
+A breaker watches the outcome of recent calls (sliding time window). Once the
+error rate crosses the threshold it opens and calls fail fast with
+CircuitOpenError instead of waiting on a struggling upstream; after
+`open_seconds` one trial call is let through (half-open) and its outcome
+closes or re-opens the circuit.
+
+Retries respect the request deadline (utils.deadline): each attempt's timeout
+is cut to the time left and no retry starts once there is not enough left.
+hedge() optionally races a second copy of a slow idempotent call once the
+first has run past the endpoint's recent p95 latency.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from utils import deadline
+from utils.deadline import DeadlineExceeded
+from utils.metrics import record_hedge, record_retry
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} temporarily unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class TransientUpstreamError(Exception):
+    """A 200 response whose body reports a retryable failure (e.g. Google UNKNOWN_ERROR)."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Failures worth retrying / counting against the breaker: network, timeouts, 429, 5xx."""
+    if isinstance(exc, (httpx.TransportError, TransientUpstreamError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return False
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.5,
+        min_calls: int = 10,
+        window: float = 30.0,
+        open_seconds: float = 15.0,
+    ) -> None:
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._trial_inflight = False
+        self.short_circuited = 0
+        self.opened = 0
+        register_breaker(self)
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not go upstream."""
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._trial_inflight:
+            self._trial_inflight = True
+            return
+        self.short_circuited += 1
+        raise CircuitOpenError(self.name, max(0.0, self.open_seconds - (now - self._opened_at)))
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self.opened += 1
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._trial_inflight = False
+            if ok:
+                self.state = CLOSED
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+        self._outcomes.append((now, ok))
+        self._trim(now)
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, good in self._outcomes if not good)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self._open(now)
+
+    def abandon_trial(self) -> None:
+        """The half-open trial call was cancelled without an outcome: allow another."""
+        self._trial_inflight = False
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        calls = len(self._outcomes)
+        failures = sum(1 for _, good in self._outcomes if not good)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_error_rate": round(failures / calls, 4) if calls else 0.0,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+async def call_with_retry(
+    fn: Callable[[float], Awaitable[T]],
+    breaker: Optional[CircuitBreaker] = None,
+    retries: int = 2,
+    base_delay: float = 0.2,
+    max_delay: float = 2.0,
+    label: Tuple[str, str] = ("upstream", "call"),
+    timeout: float = 30.0,
+    min_attempt: float = 0.1,
+) -> T:
+    """
+    Run an idempotent call through `breaker`, retrying transient failures with
+    full-jitter exponential backoff. Non-transient errors (4xx, bad input)
+    are raised at once and are not recorded by the breaker at all.
+
+    `fn` receives the timeout for its attempt: `timeout`, cut to what is left
+    of the request deadline. A retry is skipped when less than `min_attempt`
+    seconds would remain after the backoff, and a timeout caused by the
+    deadline (not by the upstream) raises DeadlineExceeded without counting
+    against the breaker - or, if the deadline has been extended since, is
+    simply tried again.
+    """
+    attempt = 0
+    while True:
+        deadline.check(f"{label[0]} {label[1]}")
+        if breaker is not None:
+            breaker.before_call()
+        attempt_timeout = deadline.timeout_for(timeout)
+        try:
+            result = await fn(attempt_timeout)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.abandon_trial()
+            raise
+        except Exception as e:
+            if isinstance(e, httpx.TimeoutException) and attempt_timeout < timeout:
+                if breaker is not None:
+                    breaker.abandon_trial()
+                left = deadline.remaining()
+                if left is None or left >= min_attempt:
+                    # The deadline was extended meanwhile (a single-flight caller with
+                    # more time joined): the cut-short attempt does not count
+                    continue
+                raise DeadlineExceeded(f"Deadline exceeded during {label[0]} {label[1]}") from e
+            transient = is_transient(e)
+            if breaker is not None:
+                if transient:
+                    breaker.record(False)
+                else:
+                    # Says nothing about upstream health: neither a failure nor a
+                    # success, and it must not close a half-open circuit
+                    breaker.abandon_trial()
+            if not transient or attempt >= retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt + 1)))
+            left = deadline.remaining()
+            if left is not None and left < delay + min_attempt:
+                raise
+        else:
+            if breaker is not None:
+                breaker.record(True)
+            return result
+        attempt += 1
+        record_retry(*label)
+        await asyncio.sleep(delay)
+
+
+class LatencyTracker:
+    """Recent successful-call latencies for one endpoint, and the hedging budget."""
+
+    def __init__(
+        self,
+        name: str,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        max_ratio: float = 0.1,
+        size: int = 256,
+    ) -> None:
+        self.name = name
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._cached: Optional[float] = None
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        register_tracker(self)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._cached = None
+
+    def percentile(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._cached is None:
+            ordered: List[float] = sorted(self._samples)
+            self._cached = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        return self._cached
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None (too few samples / hedge budget spent)."""
+        if self.hedged >= self.max_ratio * self.calls:
+            return None
+        return self.percentile()
+
+    def stats(self) -> Dict[str, Any]:
+        p = self.percentile()
+        return {
+            "samples": len(self._samples),
+            f"p{round(self.quantile * 100)}_s": round(p, 4) if p is not None else None,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+async def hedge(fn: Callable[[], Awaitable[T]], tracker: LatencyTracker, label: Tuple[str, str]) -> T:
+    """
+    Run `fn`; if it is still pending after the tracker's p95, start a second
+    copy and return whichever succeeds first (the other is cancelled). Only
+    for idempotent calls. Hedges are capped at `max_ratio` of all calls so a
+    slow upstream is not hit with twice the load.
+    """
+    tracker.calls += 1
+
+    async def timed() -> T:
+        started = time.monotonic()
+        result = await fn()
+        tracker.observe(time.monotonic() - started)
+        return result
+
+    delay = tracker.hedge_delay()
+    left = deadline.remaining()
+    if delay is None or (left is not None and left <= delay):
+        return await timed()
+
+    primary = asyncio.ensure_future(timed())
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if primary in done:
+            return primary.result()
+        tracker.hedged += 1
+        backup = asyncio.ensure_future(timed())
+        pending.add(backup)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    won = task is backup
+                    tracker.hedge_wins += won
+                    record_hedge(*label, "hedge" if won else "primary")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def register_breaker(breaker: CircuitBreaker) -> None:
+    _breakers[breaker.name] = breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: b.stats() for name, b in _breakers.items()}
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+
+
+def register_tracker(tracker: LatencyTracker) -> None:
+    _trackers[tracker.name] = tracker
+
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: t.stats() for name, t in _trackers.items()}
@@ -0,0 +1,80 @@
+"""
+Fast response path for the high-volume /maps endpoints.
+
+Handlers return render(request, result) instead of the model itself. That
+skips FastAPI's response_model round trip (model_dump, re-validation, a second
+serialization to JSON-compatible Python, then json.dumps); routes keep
+`response_model` for the OpenAPI schema. The body is encoded once:
+
+- Accept: application/msgpack (x-msgpack / vnd.msgpack) -> MessagePack, when
+  the optional `msgpack` package is installed;
+- otherwise JSON, straight from pydantic-core's serializer
+  (see benchmarks/serialization.py for the numbers).
+
+Bodies of MAPS_COMPRESS_MIN_BYTES or more (long geometries) are gzip / brotli
+compressed when the client accepts it.
+"""
+import gzip
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from config import get_settings
+from utils.static import parse_accept
+
+try:
+    import msgpack
+except ImportError:  # optional: msgpack requests get JSON
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+_MSGPACK_TYPES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+# Per-request compression: favour speed over ratio
+_GZIP_LEVEL = 5
+_BROTLI_QUALITY = 4
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """MSGPACK if the client names a msgpack type at least as high as JSON, else JSON."""
+    if msgpack is None or not accept:
+        return JSON
+    accepted = parse_accept(accept)
+    q_msgpack = max(accepted.get(t, 0.0) for t in _MSGPACK_TYPES)
+    q_json = max(accepted.get(JSON, 0.0), accepted.get("application/*", 0.0), accepted.get("*/*", 0.0))
+    return MSGPACK if q_msgpack > 0 and q_msgpack >= q_json else JSON
+
+
+def encode(result: BaseModel, media_type: str) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb(result.model_dump(), use_bin_type=True)
+    return result.model_dump_json().encode("utf-8")
+
+
+def compress(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """(body, Content-Encoding) - unchanged below the size threshold or without a usable encoding."""
+    if len(body) < get_settings().MAPS_COMPRESS_MIN_BYTES or not accept_encoding:
+        return body, None
+    accepted = parse_accept(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return brotli.compress(body, quality=_BROTLI_QUALITY), "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return gzip.compress(body, compresslevel=_GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+
+def render(request: Request, result: BaseModel, status_code: int = 200) -> Response:
+    media_type = negotiate(request.headers.get("accept"))
+    body, encoding = compress(encode(result, media_type), request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from utils import deadline
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "context")
+
+    def __init__(self, task: "asyncio.Task[Any]", context: contextvars.Context) -> None:
+        self.task = task
+        self.waiters = 0
+        # The task's own context: its deadline is moved out as later callers join
+        self.context = context
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one in-flight awaitable.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task and receive the same result (or the same
+    exception). A caller being cancelled does not cancel the shared work unless
+    it was the last one waiting for it.
+
+    The shared work runs under the latest deadline among its callers: it
+    starts with the first caller's, and a caller that joins with more time
+    (or none) extends it, so one client's tight X-Request-Timeout cannot fail
+    the call for everyone else while upstream timeouts and retries still
+    shrink to fit. Each caller stops waiting at its own deadline
+    (DeadlineExceeded), and the work is cancelled once nobody is waiting.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: Dict[str, _Call] = {}
+        self.calls = 0
+        self.collapsed = 0
+        register_flight(self)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        call = self._inflight.get(key)
+        if call is None:
+            context = contextvars.copy_context()
+            call = _Call(asyncio.get_running_loop().create_task(fn(), context=context), context)
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda _t, c=call: self._forget(key, c))
+        else:
+            self.collapsed += 1
+            # The task is suspended (we are running), so its context can be entered here
+            call.context.run(deadline.extend_to, deadline.current())
+
+        call.waiters += 1
+        try:
+            return await deadline.bound(asyncio.shield(call.task), self.name)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Everybody gave up on this result: stop the upstream work and
+                # make sure no new caller joins a task that is being cancelled.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "collapsed": self.collapsed, "inflight": len(self._inflight)}
+
+
+_flights: Dict[str, SingleFlight] = {}
+
+
+def register_flight(flight: SingleFlight) -> None:
+    _flights[flight.name] = flight
+
+
+def singleflight_stats() -> Dict[str, Dict[str, int]]:
+    return {name: flight.stats() for name, flight in _flights.items()}
@@ -0,0 +1,143 @@
+"""
+Render-once HTML delivery: precompressed variants, ETag, Cache-Control and 304s.
+
+A StaticAsset holds one rendered body plus its gzip (and brotli, when the
+optional `brotli` package is installed) encodings, computed once. PageCache
+keeps rendered assets for parameterized pages (the map views) keyed by their
+normalized query parameters, so a repeated view costs a dict lookup.
+"""
+import gzip
+import hashlib
+import os
+from string import Template
+from typing import Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from utils.cache import MISSING, LRUCache, register_cache
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+# Bodies smaller than this are not worth a Content-Encoding header
+_MIN_COMPRESS = 256
+_SUFFIX = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+_templates: Dict[str, Template] = {}
+
+
+def load_template(name: str) -> Template:
+    """string.Template from api/templates, read from disk once."""
+    tpl = _templates.get(name)
+    if tpl is None:
+        with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as f:
+            tpl = _templates[name] = Template(f.read())
+    return tpl
+
+
+def parse_accept(header: str) -> Dict[str, float]:
+    """Accept / Accept-Encoding header -> {value: q}."""
+    out: Dict[str, float] = {}
+    for part in header.split(","):
+        name, *params = part.strip().split(";")
+        q = 1.0
+        for param in params:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        name = name.strip()
+        if name:
+            out[name.lower()] = q
+    return out
+
+
+class StaticAsset:
+    def __init__(self, body, media_type: str = "text/html; charset=utf-8") -> None:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.media_type = media_type
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= _MIN_COMPRESS:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+    def pick_encoding(self, accept_encoding: Optional[str]) -> str:
+        accepted = parse_accept(accept_encoding or "")
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return "identity"
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            # Weak comparison, ignoring the per-encoding suffix
+            tag = tag.removeprefix("W/").strip('"')
+            for suffix in ("-gz", "-br"):
+                tag = tag.removesuffix(suffix)
+            if tag == self.etag:
+                return True
+        return False
+
+    def respond(self, request: Request, cache_control: str, status_code: int = 200) -> Response:
+        encoding = self.pick_encoding(request.headers.get("accept-encoding"))
+        headers = {
+            "ETag": f'"{self.etag}{_SUFFIX[encoding]}"',
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if self.not_modified(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            content=self.variants[encoding],
+            status_code=status_code,
+            media_type=self.media_type,
+            headers=headers,
+        )
+
+
+class PageCache:
+    """Rendered pages by normalized parameters (in-process LRU with TTL)."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        self.name = name
+        self.pages = LRUCache(maxsize, ttl)
+        self.hits_l1 = 0
+        self.misses = 0
+        register_cache(self)
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> StaticAsset:
+        asset = self.pages.get(key)
+        if asset is not MISSING:
+            self.hits_l1 += 1
+            return asset
+        self.misses += 1
+        asset = StaticAsset(render())
+        self.pages.set(key, asset)
+        return asset
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits_l1 + self.misses
+        return {
+            "size": len(self.pages),
+            "maxsize": self.pages.maxsize,
+            "hits_l1": self.hits_l1,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits_l1 / lookups, 4) if lookups else 0.0,
+        }